@@ -1,18 +1,65 @@
-from typing import Any, Iterable, Iterator, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Tuple, Union
+from array import array
+import sys
 
 __all__ = [
     "Parameter",
+    "ParameterRow",
+    "ParameterTable",
 ]
 
 
+# validated keys, interned
+_keys: Dict[str, str] = {}
+# validated key tuples of `Parameter.from_values`
+_key_tuples: Dict[Tuple[Any, ...], Tuple[str, ...]] = {}
+
+
+def _internKey(k: Any) -> str:
+    key = _keys.get(k) if k.__class__ is str else None
+    if key is None:
+        key = str(k)
+        if not key.isidentifier():
+            raise ValueError(f"is not a valid identifier key - {key!r}")
+        key = _keys.setdefault(key, sys.intern(key))
+    return key
+
+
 class Parameter:
     def __init__(self, *args, **kwargs) -> None:
-        for k, v in dict(*args, **kwargs).items():
-            key = str(k)
-            if key.isidentifier():
-                self.__dict__[key] = v
-            else:
-                raise ValueError(f"is not a valid identifier key - {key!r}")
+        d = self.__dict__
+        items = dict(*args, **kwargs).items() if args else kwargs.items()
+        for k, v in items:
+            d[_internKey(k)] = v
+
+    @classmethod
+    def from_trusted(cls, mapping: Mapping[str, Any]) -> "Parameter":
+        """
+        Build from a mapping whose keys are known to be valid identifiers,
+        skipping validation.
+        """
+        obj = cls.__new__(cls)
+        obj.__dict__.update(mapping)
+        return obj
+
+    @classmethod
+    def from_values(cls, keys: Tuple[Any, ...], values: Iterable[Any]) -> "Parameter":
+        """
+        Build from keys and values, each distinct tuple of keys is validated and
+        interned once, then reused.
+        """
+        checked = _key_tuples.get(keys)
+        if checked is None:
+            checked = _key_tuples.setdefault(keys, tuple(map(_internKey, keys)))
+        obj = cls.__new__(cls)
+        obj.__dict__.update(zip(checked, values))
+        return obj
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (self.__class__.from_trusted, (self.__dict__,))
+
+    def __copy__(self) -> "Parameter":
+        return self.from_trusted(self.__dict__)
 
     def __repr__(self) -> str:
         return "{}({})".format(
@@ -20,8 +67,9 @@ class Parameter:
             ", ".join(f"{k}={v!r}" for k, v in self.__dict__.items()),
         )
 
-    def __getattr__(self, *args, **kwargs) -> None:
-        pass
+    def __getattr__(self, name: str) -> None:
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
 
     def __getitem__(self, name: str) -> Any:
         return self.__dict__[name]
@@ -33,10 +81,327 @@ class Parameter:
         return self.__dict__.get(*args, **kwargs)
 
     def keys(self) -> Iterable[str]:
-        return tuple(self.__dict__.keys())
+        return tuple(self.__dict__)
 
     def values(self) -> Iterable[Any]:
         return tuple(self.__dict__.values())
 
     def __call__(self, *args, default: Any = None) -> Tuple[Any, ...]:
         return tuple(self.get(k, default) for k in args)
+
+
+class ParameterRow:
+    """
+    Lightweight `Parameter` compatible view of one row of a `ParameterTable`.
+    """
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "ParameterTable", index: int) -> None:
+        self.table = table
+        self.index = index
+
+    def __repr__(self) -> str:
+        return "{}({})".format(
+            self.__class__.__name__,
+            ", ".join(f"{k}={v!r}" for k, v in self),
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name in self.__slots__:
+            raise AttributeError(name)
+        return self.get(name)
+
+    def __getitem__(self, name: str) -> Any:
+        return self.table.column(name)[self.index]
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self.keys(), self.values())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (ParameterRow, Parameter)):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    def get(self, name: str, default: Any = None) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterable[str]:
+        return self.table.keys()
+
+    def values(self) -> Iterable[Any]:
+        index = self.index
+        return tuple(col[index] for col in self.table.columns())
+
+    def __call__(self, *args, default: Any = None) -> Tuple[Any, ...]:
+        return tuple(self.get(k, default) for k in args)
+
+    def to_parameter(self) -> Parameter:
+        return Parameter(self)
+
+
+def _packColumn(values: Union[list, array]) -> Union[list, array]:
+    """
+    Store a column of only int as `array("q")` and of only float as `array("d")`.
+    """
+    if isinstance(values, array) or not values:
+        return values
+    first = values[0].__class__
+    if first is int or first is float:
+        if all(v.__class__ is first for v in values):
+            try:
+                return array("q" if first is int else "d", values)
+            except OverflowError:
+                pass
+    return values
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return np
+
+
+class ParameterTable:
+    """
+    Column-oriented container of many records sharing the same keys.
+
+    Every key is stored as one column, rows are returned as `ParameterRow` views.
+    Missing values are stored as None. Columns of only int or only float are
+    stored as `array`, other columns as lists; `pack` converts columns filled
+    by `append`. With NumPy, `where` / `filter` scan whole columns at once.
+
+    >>> table = ParameterTable.from_records(devices)
+    >>> table.filter(model="nmos", width=lambda w: w > 1e-6)
+
+    Parameters
+    ---
+        keys : Keys of the records.
+        columns : Initial values of every key, all of the same length.
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[str],
+        columns: Union[Mapping[str, Iterable[Any]], None] = None,
+    ) -> None:
+        self.__keys: Tuple[str, ...] = tuple(map(_internKey, keys))
+        if len(set(self.__keys)) != len(self.__keys):
+            raise ValueError(f"duplicate keys - {self.__keys!r}")
+        columns = {} if columns is None else columns
+        unknown = set(columns) - set(self.__keys)
+        if unknown:
+            raise KeyError(f"columns not in keys - {sorted(unknown)!r}")
+        self.__columns: Dict[str, Union[list, array]] = {}
+        for k in self.__keys:
+            col = columns.get(k, ())
+            self.__columns[k] = _packColumn(
+                array(col.typecode, col) if isinstance(col, array) else list(col)
+            )
+        lengths = {len(col) for col in self.__columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("columns have different lengths")
+        self.__length = lengths.pop() if lengths else 0
+        # NumPy 列缓存, 按行数判断是否过期 (只会追加行)
+        self.__arrays: Dict[str, Tuple[int, Any]] = {}
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Union[Parameter, Mapping[str, Any]]],
+        keys: Union[Iterable[str], None] = None,
+    ) -> "ParameterTable":
+        """
+        Build a table from `Parameter` or mappings, keys default to the union of
+        the record keys in order of appearance.
+        """
+        records = [dict(r) for r in records]
+        if keys is None:
+            keys = list(dict.fromkeys(k for r in records for k in r))
+        table = cls(keys)
+        for k in table.__keys:
+            table.__columns[k] = _packColumn([r.get(k) for r in records])
+        table.__length = len(records)
+        return table
+
+    def pack(self) -> None:
+        """
+        Convert list columns holding only int or only float to `array`.
+        """
+        for k, col in self.__columns.items():
+            self.__columns[k] = _packColumn(col)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(keys={list(self.__keys)!r}, rows={len(self)})"
+        )
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __iter__(self) -> Iterator[ParameterRow]:
+        return (ParameterRow(self, i) for i in range(self.__length))
+
+    def __getitem__(self, index: int) -> ParameterRow:
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError(f"row index out of range - {index}")
+        return ParameterRow(self, index)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__keys
+
+    def columns(self) -> Iterable[Union[list, array]]:
+        return self.__columns.values()
+
+    def column(self, key: str, numpy: bool = False) -> Any:
+        """
+        Values of `key`, as a read-only NumPy array if `numpy`. The array is
+        cached until rows are appended.
+        """
+        col = self.__columns[key]
+        if not numpy:
+            return col
+        np = _numpy()
+        if np is None:
+            raise ImportError("NumPy is not installed.")
+        cached = self.__arrays.get(key)
+        if cached is not None and cached[0] == self.__length:
+            return cached[1]
+        # list 列可能混有 None 或不同类型, 保持 Python 对象比较的语义
+        arr = np.array(col) if isinstance(col, array) else np.array(col, dtype=object)
+        arr.flags.writeable = False
+        self.__arrays[key] = (self.__length, arr)
+        return arr
+
+    def append(self, *args, **kwargs) -> None:
+        """
+        Append a record, arguments as for `dict`.
+        """
+        record = dict(*args, **kwargs)
+        unknown = set(record) - set(self.__keys)
+        if unknown:
+            raise KeyError(f"not in keys - {sorted(unknown)!r}")
+        for k, col in self.__columns.items():
+            value = record.get(k)
+            if isinstance(col, array):
+                if value.__class__ is (int if col.typecode == "q" else float):
+                    try:
+                        col.append(value)
+                        continue
+                    except OverflowError:
+                        pass
+                col = self.__columns[k] = col.tolist()
+            col.append(value)
+        self.__length += 1
+
+    def extend(self, records: Iterable[Union[Parameter, Mapping[str, Any]]]) -> None:
+        for record in records:
+            self.append(record)
+
+    def take(self, indices: Iterable[int]) -> "ParameterTable":
+        """
+        New table with the rows at `indices`.
+        """
+        indices = list(indices)
+        columns = {}
+        for k, col in self.__columns.items():
+            if isinstance(col, array):
+                columns[k] = array(col.typecode, [col[i] for i in indices])
+            else:
+                columns[k] = [col[i] for i in indices]
+        return self.__class__(self.__keys, columns)
+
+    def where(
+        self,
+        mask: Union[Iterable[bool], None] = None,
+        **conditions: Union[Any, Callable[[Any], bool]],
+    ) -> List[int]:
+        """
+        Indices of rows matching `mask` (e.g. a NumPy boolean array) and all
+        `conditions`, a condition is a value to compare or a predicate.
+
+        With NumPy, values are compared on the whole column at once, and a
+        predicate is first called once with the whole column as an array; if it
+        does not return a boolean array it is called per remaining row.
+        """
+        np = _numpy()
+        if np is not None:
+            return self.__where_numpy(np, mask, conditions)
+        if mask is None:
+            indices = range(self.__length)
+        elif hasattr(mask, "nonzero"):
+            # NumPy boolean array
+            indices = mask.nonzero()[0].tolist()
+        else:
+            indices = [i for i, hit in enumerate(mask) if hit]
+        for key, cond in conditions.items():
+            col = self.__columns[key]
+            if callable(cond):
+                indices = [i for i in indices if cond(col[i])]
+            else:
+                indices = [i for i in indices if col[i] == cond]
+        return list(indices)
+
+    def __where_numpy(self, np: Any, mask: Any, conditions: dict) -> List[int]:
+        length = self.__length
+        if mask is None:
+            selected = np.ones(length, dtype=bool)
+        else:
+            selected = np.array(mask, dtype=bool)
+        for key, cond in conditions.items():
+            hit = None
+            if callable(cond):
+                try:
+                    hit = cond(self.column(key, numpy=True))
+                except Exception:
+                    hit = None
+                if not (
+                    isinstance(hit, np.ndarray)
+                    and hit.dtype == bool
+                    and hit.shape == (length,)
+                ):
+                    hit = None
+            elif cond is None or isinstance(cond, (str, int, float)):
+                hit = self.column(key, numpy=True) == cond
+            if hit is not None:
+                selected &= hit
+                continue
+            # 无法向量化的条件, 只对剩下的行逐个判断
+            col = self.__columns[key]
+            for i in np.flatnonzero(selected).tolist():
+                value = col[i]
+                if not (cond(value) if callable(cond) else value == cond):
+                    selected[i] = False
+        return np.flatnonzero(selected).tolist()
+
+    def filter(
+        self,
+        mask: Union[Iterable[bool], None] = None,
+        **conditions: Union[Any, Callable[[Any], bool]],
+    ) -> "ParameterTable":
+        """
+        New table with the rows matching, see `where`.
+        """
+        return self.take(self.where(mask, **conditions))
+
+    def select(self, *keys: str) -> "ParameterTable":
+        """
+        New table with only `keys`.
+        """
+        return self.__class__(keys, {k: self.__columns[k] for k in keys})
+
+    def group(self, key: str) -> Dict[Any, "ParameterTable"]:
+        """
+        Split into tables by the values of `key`, in order of appearance.
+        """
+        groups: Dict[Any, List[int]] = {}
+        for i, value in enumerate(self.__columns[key]):
+            groups.setdefault(value, []).append(i)
+        return {value: self.take(indices) for value, indices in groups.items()}
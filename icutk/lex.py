@@ -0,0 +1,996 @@
+from __future__ import annotations
+from io import TextIOBase, TextIOWrapper
+from os import PathLike
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, Union
+from array import array
+from bisect import bisect_right
+from collections import deque
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+from ply.lex import (
+    LexError,
+    Lexer,
+    TOKEN,
+    lex,
+)
+
+from .string import LineIterator
+
+__all__ = [
+    "TOKEN",
+    "LexToken",
+    "Lexer",
+    "MetaLexer",
+    "BaseLexer",
+    "TokenBlock",
+    "tokenizeParallel",
+    "SubcktIndex",
+    "TokenCache",
+]
+
+
+# 整行注释替换为空行
+_COMMENT_LINE_RE = re.compile(r"^[ \t]*\*[^\n]*", re.M)
+# 续行: 换行 (以及中间的空行) 和行首的 "+" 一起去掉
+_JOIN_RE = re.compile(r"\n(?:[ \t]*\n)*[ \t]*\+")
+# 开始新语句的行, 不是空行, 注释或续行
+_STATEMENT_START_RE = re.compile(r"[ \t]*[^ \t\n+*]")
+# 子电路边界, .SUBCKT 行之前和 .ENDS 行之后切开
+_BLOCK_BOUNDARY_RE = re.compile(
+    rb"^[ \t]*\.(subckt|ends)\b[ \t]*([^\s]*)[^\n]*\n?", re.I | re.M
+)
+# .SUBCKT 行 (含 "+" 续行) 与 .ENDS 行
+_SUBCKT_RE = re.compile(
+    rb"^[ \t]*\.subckt[ \t]+(?P<name>[^\s]+)(?P<pins>[^\n]*(?:\n[ \t]*\+[^\n]*)*)"
+    rb"|^[ \t]*\.ends\b[^\n]*\n?",
+    re.I | re.M,
+)
+
+# 行内注释, "$" 前面必须是空白
+_INLINE_COMMENT_RE = re.compile(r"(?:^|[ \t])\$[^\n]*", re.M)
+# 续行开头的 "+"
+_CONTINUATION_RE = re.compile(r"\n[ \t]*\+")
+
+
+def _subcktPins(header: str) -> List[str]:
+    """
+    Pins of a `.SUBCKT` line after the name, up to `PARAMS:` or the first
+    parameter assignment.
+    """
+    header = _INLINE_COMMENT_RE.sub("", header)
+    items = _CONTINUATION_RE.sub(" ", header).split()
+    pins = []
+    for i, item in enumerate(items):
+        if item.lower().startswith("params:") or "=" in item:
+            break
+        if i + 1 < len(items) and items[i + 1].startswith("="):
+            # "w = 1"
+            break
+        pins.append(item)
+    return pins
+
+
+def _spiceClean(data: str) -> Tuple[str, List[int], List[int]]:
+    """
+    Blank `*` comment lines and join `+` continuation lines to their statement.
+
+    Return the text, the position of every join in it and the total number of
+    newlines removed up to that join, to map tokens back to their line.
+    """
+    data = _COMMENT_LINE_RE.sub("", data)
+    pieces: List[str] = []
+    positions: List[int] = []
+    removed: List[int] = []
+    last = length = count = 0
+    for m in _JOIN_RE.finditer(data):
+        piece = data[last : m.start()]
+        pieces.append(piece)
+        length += len(piece)
+        count += m.group().count("\n")
+        positions.append(length)
+        removed.append(count)
+        pieces.append(" ")
+        length += 1
+        last = m.end()
+    if not positions:
+        return data, positions, removed
+    pieces.append(data[last:])
+    return "".join(pieces), positions, removed
+
+
+def _statementStart(data: str) -> int:
+    """
+    Start of the last line beginning a new statement, 0 if there is none.
+    Everything before it is complete, no continuation line can follow.
+    """
+    pos = len(data)
+    while pos > 0:
+        nl = data.rfind("\n", 0, pos)
+        if nl < 0:
+            break
+        if _STATEMENT_START_RE.match(data, nl + 1):
+            return nl + 1
+        pos = nl
+    return 0
+
+
+class LexToken:
+    """
+    Token produced by `MetaLexer`.
+
+    Same attributes as `ply.lex.LexToken` but slotted, so a token costs a
+    handful of pointers instead of a full instance `__dict__`.
+    `filename` is only set on tokens produced by `MetaLexer.tokenize_file`.
+    """
+
+    __slots__ = ("type", "value", "lineno", "lexpos", "lexer", "filename")
+
+    type: str
+    value: Any
+    lineno: int
+    lexpos: int
+    lexer: Lexer
+    filename: str
+
+    def __str__(self) -> str:
+        return "LexToken(%s,%r,%d,%d)" % (
+            self.type,
+            self.value,
+            self.lineno,
+            self.lexpos,
+        )
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+class MetaLexer:
+    # 每个子类的 ply 词法表只构建一次, 之后的实例都从模板 clone
+    _lexer_cache: Dict[type, Lexer] = {}
+    _lexer_lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls is MetaLexer:
+            raise TypeError(f"{cls.__name__} cannot be instantiated")
+        return super().__new__(cls)
+
+    t_ignore = " \t"
+
+    def t_error(self, t):
+        t.lexer.skip(1)
+
+    def __init__(self) -> None:
+        self.lexer = self._getLexer()
+
+    @classmethod
+    def _buildLexer(cls) -> Lexer:
+        """
+        Build the ply lexer tables of `cls`.
+
+        The rules are bound to a bare template instance, so the cached lexer
+        does not keep any real instance (or its input) alive.
+        """
+        return lex(module=object.__new__(cls), debug=False)
+
+    def _getLexer(self) -> Lexer:
+        cls = type(self)
+        template = MetaLexer._lexer_cache.get(cls)
+        if template is None:
+            with MetaLexer._lexer_lock:
+                template = MetaLexer._lexer_cache.get(cls)
+                if template is None:
+                    template = cls._buildLexer()
+                    MetaLexer._lexer_cache[cls] = template
+        lexer = template.clone(self)
+        # clone() 不会重新绑定 t_eof, begin() 会从 lexstateeoff 取回
+        lexer.lexstateeoff = {
+            state: getattr(self, func.__name__)
+            for state, func in template.lexstateeoff.items()
+        }
+        # clone() 只重新绑定了状态表, 当前状态的 lexre 需要刷新
+        lexer.begin(lexer.lexstate)
+        return lexer
+
+    def input(self, data: Union[str, TextIOWrapper]):
+        if isinstance(data, str):
+            pass
+        elif isinstance(data, TextIOWrapper):
+            data = data.read()
+        else:
+            raise TypeError(f"data must be str or TextIOWrapper - {data!r}")
+        self.lexer.input(data)
+
+    def token(self) -> Optional[LexToken]:
+        """
+        Return the next token, or None at the end of input.
+
+        Same algorithm as `ply.lex.Lexer.token` (so states, `t_error` and
+        `t_eof` rules behave identically) but producing slotted `LexToken`
+        and with the hot attributes kept in locals.
+        """
+        lexer = self.lexer
+        lexpos = lexer.lexpos
+        lexlen = lexer.lexlen
+        lexignore = lexer.lexignore
+        lexdata = lexer.lexdata
+
+        while lexpos < lexlen:
+            if lexdata[lexpos] in lexignore:
+                lexpos += 1
+                continue
+
+            for lexre, lexindexfunc in lexer.lexre:
+                m = lexre.match(lexdata, lexpos)
+                if m is None:
+                    continue
+
+                func, type_ = lexindexfunc[m.lastindex]
+                tok = LexToken()
+                tok.value = m.group()
+                tok.lineno = lexer.lineno
+                tok.lexpos = lexpos
+                tok.type = type_
+
+                if func is None:
+                    if type_:
+                        lexer.lexpos = m.end()
+                        return tok
+                    lexpos = m.end()
+                    break
+
+                lexpos = m.end()
+                tok.lexer = lexer
+                lexer.lexmatch = m
+                lexer.lexpos = lexpos
+
+                newtok = func(tok)
+                if not newtok:
+                    lexpos = lexer.lexpos
+                    lexignore = lexer.lexignore
+                    break
+                return newtok
+            else:
+                char = lexdata[lexpos]
+                if char in lexer.lexliterals:
+                    tok = LexToken()
+                    tok.type = tok.value = char
+                    tok.lineno = lexer.lineno
+                    tok.lexpos = lexpos
+                    lexer.lexpos = lexpos + 1
+                    return tok
+
+                if lexer.lexerrorf:
+                    tok = LexToken()
+                    tok.value = lexdata[lexpos:]
+                    tok.lineno = lexer.lineno
+                    tok.type = "error"
+                    tok.lexer = lexer
+                    tok.lexpos = lexpos
+                    lexer.lexpos = lexpos
+                    newtok = lexer.lexerrorf(tok)
+                    if lexpos == lexer.lexpos:
+                        raise LexError(
+                            f"Scanning error. Illegal character {char!r}",
+                            lexdata[lexpos:],
+                        )
+                    lexpos = lexer.lexpos
+                    if not newtok:
+                        continue
+                    return newtok
+
+                lexer.lexpos = lexpos
+                raise LexError(
+                    f"Illegal character {char!r} at index {lexpos}", lexdata[lexpos:]
+                )
+
+        if lexer.lexeoff:
+            tok = LexToken()
+            tok.type = "eof"
+            tok.value = ""
+            tok.lineno = lexer.lineno
+            tok.lexpos = lexpos
+            tok.lexer = lexer
+            lexer.lexpos = lexpos
+            return lexer.lexeoff(tok)
+
+        lexer.lexpos = lexpos + 1
+        if lexdata is None:
+            raise RuntimeError("No input string given with input()")
+        return None
+
+    def tokenize_file(
+        self,
+        file: Union[str, PathLike, TextIOBase],
+        chunk_size: int = 1 << 20,
+        encoding: str = "utf-8",
+        spice: bool = True,
+    ) -> Iterator[LexToken]:
+        """
+        Tokenize a file chunk by chunk, memory stays at about `chunk_size`.
+
+        Chunks are cut at the last newline (with `spice`, before the last line
+        starting a statement), so a token must not span lines. `lexpos` is
+        relative to the chunk, `lineno` and `filename` give the position in the
+        file, also for tokens of joined continuation lines.
+
+        Parameters
+        ---
+            file : Path or opened text file.
+            chunk_size : Number of characters read at once.
+            encoding : Encoding used when `file` is a path.
+            spice : Strip `*` comment lines and join `+` continuation lines.
+        """
+        if isinstance(file, TextIOBase):
+            filename = getattr(file, "name", "<stream>")
+            yield from self._tokenizeStream(file, str(filename), chunk_size, spice)
+        else:
+            with open(file, encoding=encoding) as f:
+                yield from self._tokenizeStream(f, str(file), chunk_size, spice)
+
+    def _tokenizeStream(
+        self, f: TextIOBase, filename: str, chunk_size: int, spice: bool
+    ) -> Iterator[LexToken]:
+        lineno = 1
+        tail = ""
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                chunk = tail + chunk
+                # 续行可能在下一个 chunk 里, 最后一条语句留到下次
+                cut = _statementStart(chunk) if spice else chunk.rfind("\n") + 1
+                if cut == 0:
+                    # 一条语句比 chunk 还长, 继续读
+                    tail = chunk
+                    continue
+                chunk, tail = chunk[:cut], chunk[cut:]
+            elif tail:
+                chunk, tail = tail, ""
+            else:
+                break
+
+            for tok in self._tokenizeText(chunk, lineno, spice):
+                tok.filename = filename
+                yield tok
+            lineno += chunk.count("\n")
+
+    def _tokenizeText(self, data: str, lineno: int, spice: bool) -> Iterator[LexToken]:
+        """
+        Tokenize `data` starting at line `lineno`, line numbers of the tokens
+        refer to `data` before comments and continuation lines are processed.
+        """
+        positions: List[int] = []
+        if spice:
+            data, positions, removed = _spiceClean(data)
+        lexer = self.lexer
+        lexer.input(data)
+        lexer.lineno = lineno
+        token = self.token
+        while True:
+            tok = token()
+            if tok is None:
+                return
+            if positions:
+                k = bisect_right(positions, tok.lexpos)
+                if k:
+                    tok.lineno += removed[k - 1]
+            yield tok
+
+    def line_count(self, s: str) -> None:
+        self.lexer.lineno += s.count("\n")
+
+    def __iter__(self) -> Iterator[LexToken]:
+        return self
+
+    def __next__(self) -> LexToken:
+        t = self.token()
+        if t is None:
+            raise StopIteration
+        return t
+
+
+class BaseLexer(MetaLexer):
+    tokens = [
+        "ID",  # abc
+        "FLOAT",  # 1.23
+        "INT",  # 10
+    ]
+
+    literals = """()[]{}<>+-*/=~!@#$%^&\\|;:'",.?_"""
+
+    def __init__(self, data: Optional[str] = None) -> None:
+        super().__init__()
+        if data is not None:
+            self.input(data)
+
+    # 字符串规则不需要回调, 比函数规则少一次 Python 调用
+    t_ID = r"[a-zA-Z_]\w*"
+
+    def t_FLOAT(self, t: LexToken):
+        r"\d+\.\d+"
+        t.value = float(t.value)
+        return t
+
+    def t_INT(self, t: LexToken):
+        r"\d+(?!\.)"
+        t.value = int(t.value)
+        return t
+
+    def t_newline(self, t: LexToken):
+        r"\n+"
+        self.line_count(t.value)
+
+
+class TokenBlock:
+    """
+    Tokens of one `.SUBCKT ... .ENDS` block (or of the text between blocks).
+
+    Tokens are stored column-wise, a block pickles as a few lists and one
+    array instead of one object per token. Iterating rebuilds `LexToken`.
+    """
+
+    __slots__ = (
+        "filename",
+        "start",
+        "end",
+        "lineno",
+        "name",
+        "types",
+        "values",
+        "lines",
+    )
+
+    def __init__(
+        self,
+        filename: str,
+        start: int,
+        end: int,
+        lineno: int,
+        name: Optional[str],
+        types: List[str],
+        values: List[Any],
+        lines: array,
+    ) -> None:
+        self.filename = filename
+        self.start = start  # byte offset
+        self.end = end
+        self.lineno = lineno  # line number of the first line
+        self.name = name  # subcircuit name, None outside of .SUBCKT
+        self.types = types
+        self.values = values
+        self.lines = lines  # line of each token, relative to `lineno`
+
+    def __reduce__(self):
+        return (
+            TokenBlock,
+            (
+                self.filename,
+                self.start,
+                self.end,
+                self.lineno,
+                self.name,
+                self.types,
+                self.values,
+                self.lines,
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __iter__(self) -> Iterator[LexToken]:
+        filename = self.filename
+        lineno = self.lineno
+        for type_, value, line in zip(self.types, self.values, self.lines):
+            tok = LexToken()
+            tok.type = type_
+            tok.value = value
+            tok.lineno = lineno + line
+            tok.lexpos = 0
+            tok.filename = filename
+            yield tok
+
+    def __repr__(self) -> str:
+        return f"TokenBlock({self.name!r}, lineno={self.lineno}, tokens={len(self)})"
+
+
+def _scanBlocks(path: str, encoding: str) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Byte ranges covering the whole file, cut at `.SUBCKT` / `.ENDS` lines, with
+    the subcircuit name of ranges starting at a `.SUBCKT` line.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            cuts: List[Tuple[int, Optional[str]]] = [(0, None)]
+            for m in _BLOCK_BOUNDARY_RE.finditer(mm):
+                if m.group(1).lower() == b"subckt":
+                    cuts.append((m.start(), m.group(2).decode(encoding) or None))
+                else:
+                    cuts.append((m.end(), None))
+    cuts.append((size, None))
+    return [
+        (start, end, name)
+        for (start, name), (end, _) in zip(cuts, cuts[1:])
+        if end > start
+    ]
+
+
+_worker_lexers: Dict[type, MetaLexer] = {}
+
+
+def _tokenizeRanges(
+    path: str,
+    ranges: List[Tuple[int, int, Optional[str]]],
+    lexer_class: Type[MetaLexer],
+    encoding: str,
+    spice: bool,
+) -> List[TokenBlock]:
+    lexer = _worker_lexers.get(lexer_class)
+    if lexer is None:
+        lexer = _worker_lexers[lexer_class] = lexer_class()
+    blocks = []
+    with open(path, "rb") as f:
+        f.seek(ranges[0][0])
+        for start, end, name in ranges:
+            data = f.read(end - start).decode(encoding)
+            newlines = data.count("\n")
+            types, values, lines = [], [], array("L")
+            for tok in lexer._tokenizeText(data, 0, spice):
+                types.append(tok.type)
+                values.append(tok.value)
+                lines.append(tok.lineno)
+            # lineno 在父进程里补上, 暂时用块内的换行数占位
+            blocks.append(
+                TokenBlock(path, start, end, newlines, name, types, values, lines)
+            )
+    return blocks
+
+
+def tokenizeParallel(
+    file: Union[str, PathLike],
+    lexer_class: Type[MetaLexer] = BaseLexer,
+    max_workers: Optional[int] = None,
+    chunk_size: int = 4 << 20,
+    encoding: str = "utf-8",
+    spice: bool = True,
+) -> Iterator[TokenBlock]:
+    """
+    Tokenize a netlist with a process pool, yield `TokenBlock` in file order.
+
+    The file is cut before every `.SUBCKT` line and after every `.ENDS` line,
+    consecutive blocks are grouped into tasks of about `chunk_size` bytes.
+    At most `2 * max_workers` tasks are in flight, so memory stays bounded
+    even if the consumer is slow.
+
+    Parameters
+    ---
+        file : Path of the netlist.
+        lexer_class : A picklable `MetaLexer` subclass, created once per worker.
+        max_workers : Number of processes, default: CPU count.
+        chunk_size : Target size in bytes of one task.
+        encoding : Encoding of the file.
+        spice : Strip `*` comment lines and join `+` continuation lines.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers < 1:
+        raise ValueError(f"max_workers should be a positive integer - {max_workers}")
+    path = str(file)
+
+    tasks: List[List[Tuple[int, int, Optional[str]]]] = []
+    task, task_size = [], 0
+    for start, end, name in _scanBlocks(path, encoding):
+        task.append((start, end, name))
+        task_size += end - start
+        if task_size >= chunk_size:
+            tasks.append(task)
+            task, task_size = [], 0
+    if task:
+        tasks.append(task)
+
+    lineno = 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        tasks_iter = iter(tasks)
+        try:
+            while True:
+                for task in tasks_iter:
+                    pending.append(
+                        executor.submit(
+                            _tokenizeRanges, path, task, lexer_class, encoding, spice
+                        )
+                    )
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if not pending:
+                    return
+                for block in pending.popleft().result():
+                    block.lineno, lineno = lineno, lineno + block.lineno
+                    yield block
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class SubcktIndex:
+    """
+    Persistent index of the subcircuits of a netlist, name -> byte range and pins.
+
+    The index is built with one scan and saved next to the netlist as
+    `<netlist>.subckt.json`, it is rebuilt when the size or mtime of the
+    netlist changes. If the index cannot be written it is kept in memory only.
+
+    Parameters
+    ---
+        file : Path of the netlist.
+        index_file : Where to store the index, default: next to the netlist.
+        encoding : Encoding of the netlist.
+    """
+
+    VERSION = 2
+
+    def __init__(
+        self,
+        file: Union[str, PathLike],
+        index_file: Union[str, PathLike, None] = None,
+        encoding: str = "utf-8",
+    ) -> None:
+        self.path = Path(file)
+        self.index_path = (
+            Path(index_file)
+            if index_file is not None
+            else Path(f"{self.path}.subckt.json")
+        )
+        self.encoding = encoding
+        self.cells: Dict[str, Tuple[int, int, List[str]]] = {}
+        self.refresh()
+
+    def _key(self) -> Dict[str, int]:
+        stat = self.path.stat()
+        return {
+            "version": self.VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def refresh(self) -> None:
+        """
+        Load the saved index, rebuild it if it is missing or outdated.
+        """
+        key = self._key()
+        try:
+            data = json.loads(self.index_path.read_text("utf-8"))
+        except (OSError, ValueError):
+            data = None
+        if isinstance(data, dict) and data.get("key") == key:
+            self.cells = {
+                name: (start, end, pins) for name, start, end, pins in data["cells"]
+            }
+            return
+        self.cells = self._scan()
+        data = {
+            "key": key,
+            "cells": [[name, *cell] for name, cell in self.cells.items()],
+        }
+        tmp_path = self.index_path.with_name(
+            f"{self.index_path.name}.{os.getpid()}.tmp"
+        )
+        try:
+            tmp_path.write_text(json.dumps(data), "utf-8")
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _scan(self) -> Dict[str, Tuple[int, int, List[str]]]:
+        cells = {}
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cells
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                stack = []
+                for m in _SUBCKT_RE.finditer(mm):
+                    if m.group("name") is not None:
+                        pins = _subcktPins(m.group("pins").decode(self.encoding))
+                        stack.append(
+                            (m.group("name").decode(self.encoding), m.start(), pins)
+                        )
+                    elif stack:
+                        name, start, pins = stack.pop()
+                        cells[name] = (start, m.end(), pins)
+        return cells
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.cells
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.cells)
+
+    def pins(self, name: str) -> List[str]:
+        return self.cells[name][2]
+
+    def range(self, name: str) -> Tuple[int, int]:
+        """
+        Byte range `[start, end)` of the subcircuit, `.ENDS` line included.
+        """
+        start, end, _ = self.cells[name]
+        return start, end
+
+    def read(self, name: str) -> str:
+        start, end = self.range(name)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode(self.encoding)
+
+    def lines(
+        self, name: str, partition: Optional[str] = None, chomp: bool = False
+    ) -> LineIterator:
+        """
+        `LineIterator` over the lines of one subcircuit only.
+        """
+        return LineIterator(
+            self.read(name).splitlines(keepends=True), partition=partition, chomp=chomp
+        )
+
+
+# 缓存条目: magic, 头部长度, JSON 头部, 之后是各个 array 的原始字节
+_TOKENS_MAGIC = b"ICUTKTOK"
+_TOKENS_FORMAT = 2
+# 值的类型: str, int, float, None
+_VALUE_KINDS = {str: 0, int: 1, float: 2, type(None): 3}
+
+
+def _encodeTokens(
+    size: int, types: List[str], values: List[Any], lines: array
+) -> Optional[bytes]:
+    """
+    Serialize a token stream, None if a value cannot be stored.
+    """
+    type_table: Dict[str, int] = {}
+    type_ids = array("H", [type_table.setdefault(t, len(type_table)) for t in types])
+    string_table: Dict[str, int] = {}
+    kinds = array("B")
+    ints, floats, string_ids = array("q"), array("d"), array("L")
+    for value in values:
+        kind = _VALUE_KINDS.get(value.__class__)
+        if kind is None:
+            return None
+        kinds.append(kind)
+        if kind == 0:
+            string_ids.append(string_table.setdefault(value, len(string_table)))
+        elif kind == 1:
+            try:
+                ints.append(value)
+            except OverflowError:
+                return None
+        elif kind == 2:
+            floats.append(value)
+    strings = [s.encode("utf-8") for s in string_table]
+    string_lengths = array("L", map(len, strings))
+    sections = [type_ids, lines, kinds, ints, floats, string_ids, string_lengths]
+    header = json.dumps(
+        {
+            "format": _TOKENS_FORMAT,
+            "byteorder": sys.byteorder,
+            "size": size,
+            "types": list(type_table),
+            "sections": [[a.typecode, a.itemsize, len(a)] for a in sections],
+        }
+    ).encode("utf-8")
+    parts = [_TOKENS_MAGIC, struct.pack("<I", len(header)), header]
+    parts.extend(a.tobytes() for a in sections)
+    parts.extend(strings)
+    return b"".join(parts)
+
+
+def _decodeTokens(data: bytes) -> Tuple[int, List[str], List[Any], array]:
+    """
+    Inverse of `_encodeTokens`, raise ValueError on a malformed entry.
+    """
+    magic_size = len(_TOKENS_MAGIC)
+    if data[:magic_size] != _TOKENS_MAGIC:
+        raise ValueError("not a token cache entry")
+    (header_size,) = struct.unpack_from("<I", data, magic_size)
+    pos = magic_size + 4
+    header = json.loads(data[pos : pos + header_size].decode("utf-8"))
+    pos += header_size
+    if header["format"] != _TOKENS_FORMAT or header["byteorder"] != sys.byteorder:
+        raise ValueError("unsupported token cache entry")
+    sections = []
+    for typecode, itemsize, length in header["sections"]:
+        section = array(typecode)
+        if section.itemsize != itemsize:
+            raise ValueError("unsupported token cache entry")
+        nbytes = itemsize * length
+        section.frombytes(data[pos : pos + nbytes])
+        if len(section) != length:
+            raise ValueError("truncated token cache entry")
+        sections.append(section)
+        pos += nbytes
+    type_ids, lines, kinds, ints, floats, string_ids, string_lengths = sections
+    strings = []
+    for length in string_lengths:
+        strings.append(data[pos : pos + length].decode("utf-8"))
+        pos += length
+    if pos != len(data) or not len(type_ids) == len(lines) == len(kinds):
+        raise ValueError("truncated token cache entry")
+
+    type_table = header["types"]
+    types = [type_table[i] for i in type_ids]
+    sources = (
+        map(strings.__getitem__, string_ids),
+        iter(ints),
+        iter(floats),
+        repeat(None),
+    )
+    getters = [source.__next__ for source in sources]
+    values = [getters[kind]() for kind in kinds]
+    return header["size"], types, values, lines
+
+
+class TokenCache:
+    """
+    Persistent cache of the token stream of whole files, in front of a lexer.
+
+    Entries are keyed by the content hash of the file, or by path, size and
+    mtime when `fast` is True, together with the lexer class and options.
+    An entry is a JSON header followed by raw `array` buffers, no pickle, so a
+    shared cache directory cannot inject code. The cache directory is bounded
+    to `max_size` bytes, least recently used entries are evicted first.
+
+    Parameters
+    ---
+        directory : Cache directory, created if missing.
+        max_size : Maximum total size of the cache directory in bytes.
+        fast : Key by path + size + mtime instead of hashing the content.
+        lexer_class : `MetaLexer` subclass used on a cache miss.
+        encoding : Encoding of the netlists.
+        spice : Strip `*` comment lines and join `+` continuation lines.
+    """
+
+    VERSION = 2
+    SUFFIX = ".tok"
+
+    def __init__(
+        self,
+        directory: Union[str, PathLike],
+        max_size: int = 1 << 30,
+        fast: bool = False,
+        lexer_class: Type[MetaLexer] = BaseLexer,
+        encoding: str = "utf-8",
+        spice: bool = True,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.fast = fast
+        self.lexer_class = lexer_class
+        self.encoding = encoding
+        self.spice = spice
+
+    def key(self, file: Union[str, PathLike]) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        lexer_name = f"{self.lexer_class.__module__}.{self.lexer_class.__qualname__}"
+        h.update(
+            f"{self.VERSION}\0{lexer_name}\0{self.spice}\0{self.encoding}\0".encode()
+        )
+        if self.fast:
+            stat = os.stat(file)
+            h.update(
+                f"{os.path.abspath(file)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()
+            )
+        else:
+            with open(file, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / f"{key}{self.SUFFIX}"
+
+    def load(self, file: Union[str, PathLike]) -> Optional[TokenBlock]:
+        """
+        Cached tokens of `file`, None on a cache miss.
+        """
+        return self._load(self._entry(self.key(file)), str(file))
+
+    def _load(self, entry: Path, filename: str) -> Optional[TokenBlock]:
+        try:
+            with open(entry, "rb") as f:
+                size, types, values, lines = _decodeTokens(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 损坏或版本不同的条目当作未命中, 直接删除
+            try:
+                entry.unlink()
+            except OSError:
+                pass
+            return None
+        try:
+            # mtime 作为 LRU 的访问时间
+            os.utime(entry)
+        except OSError:
+            pass
+        return TokenBlock(filename, 0, size, 1, None, types, values, lines)
+
+    def tokenize(self, file: Union[str, PathLike]) -> TokenBlock:
+        """
+        Tokens of `file` as one `TokenBlock`, lexing only on a cache miss.
+        Files with token values other than str, int, float or None are not cached.
+        """
+        entry = self._entry(self.key(file))
+        block = self._load(entry, str(file))
+        if block is not None:
+            return block
+
+        types, values, lines = [], [], array("L")
+        for tok in self.lexer_class().tokenize_file(
+            file, encoding=self.encoding, spice=self.spice
+        ):
+            types.append(tok.type)
+            values.append(tok.value)
+            lines.append(tok.lineno - 1)
+        size = os.stat(file).st_size
+        data = _encodeTokens(size, types, values, lines)
+        if data is not None:
+            tmp_path = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, entry)
+            except OSError:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+            else:
+                self.evict()
+        return TokenBlock(str(file), 0, size, 1, None, types, values, lines)
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in `max_size`.
+        """
+        entries = []
+        total = 0
+        for entry in self.directory.glob(f"*{self.SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+            total += stat.st_size
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self) -> None:
+        for entry in self.directory.glob(f"*{self.SUFFIX}"):
+            try:
+                entry.unlink()
+            except OSError:
+                pass
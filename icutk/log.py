@@ -1,5 +1,12 @@
-from typing import Optional, Callable
+from typing import Any, Optional, Callable, Hashable
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Lock
+from time import monotonic
+import atexit
 import logging
+import sys
 
 try:
     from rich.logging import RichHandler
@@ -21,10 +28,42 @@ except ImportError:
 
 __all__ = [
     "getLogger",
+    "enableQueueLogging",
+    "disableQueueLogging",
 ]
 
+_configured = False
+_config_lock = Lock()
+_listener: Optional[QueueListener] = None
+_queued_handlers: list = []
+
+
+class _CallableMessageFilter(logging.Filter):
+    """
+    Evaluate callable messages, only reached by records of enabled levels.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if callable(record.msg):
+            record.msg = record.msg()
+        return True
+
+
+_callable_message_filter = _CallableMessageFilter()
+
 
 class MutToneLogger:
+    """
+    Logger wrapper which can be muted.
+
+    Logging methods are bound once, a muted logger binds them to a no-op, so a
+    call costs no more than the call itself. Messages can be callables, they are
+    only evaluated when the record is emitted:
+
+    >>> logger.debug(lambda: f"{expensive()}")
+    >>> logger.debug("%s", value)
+    """
+
     method_map = {
         "log": "log",
         "debug": "debug",
@@ -35,27 +74,205 @@ class MutToneLogger:
         "exception": "exception",
     }
 
+    # log_once / log_every 记住的 key 数量上限, 超出后丢弃最久未用的
+    max_keys = 1024
+
     def __init__(self, logger: logging.Logger, mute: bool = False) -> None:
         self.logger = logger
+        logger.addFilter(_callable_message_filter)
+        self.__seen: OrderedDict = OrderedDict()
+        self.__rate: OrderedDict = OrderedDict()
         self.mute = mute
 
+    @property
+    def mute(self) -> bool:
+        return self.__mute
+
+    @mute.setter
+    def mute(self, value: bool) -> None:
+        self.__mute = bool(value)
+        for name, method in self.method_map.items():
+            if self.__mute:
+                setattr(self, name, self.mute_all)
+            else:
+                setattr(self, name, getattr(self.logger, method))
+
     def mute_all(self, *args, **kwargs) -> None:
         pass
 
     def __getattr__(self, name: str) -> Callable:
-        if name in self.method_map:
-            if self.mute:
-                return self.mute_all
-            return getattr(self.logger, self.method_map[name])
         raise AttributeError(f"No such method: {name}")
 
+    def __enabled(self, level: int) -> bool:
+        return not self.__mute and self.logger.isEnabledFor(level)
+
+    def __emit(self, level: int, msg: Any, args: tuple, kwargs: dict) -> None:
+        if sys.version_info >= (3, 8):
+            kwargs.setdefault("stacklevel", 3)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def log_once(
+        self, level: int, msg: Any, *args, key: Hashable = None, **kwargs
+    ) -> None:
+        """
+        Log only the first message with the same `key`, see `log_every` for
+        the default key. Only the last `max_keys` keys are remembered.
+        """
+        if not self.__enabled(level):
+            return
+        key = _defaultKey(msg) if key is None else key
+        seen = self.__seen
+        if key in seen:
+            seen.move_to_end(key)
+            return
+        seen[key] = None
+        if len(seen) > self.max_keys:
+            seen.popitem(last=False)
+        self.__emit(level, msg, args, kwargs)
+
+    def log_every(
+        self,
+        seconds: float,
+        level: int,
+        msg: Any,
+        *args,
+        key: Hashable = None,
+        **kwargs,
+    ) -> None:
+        """
+        Log at most one message with the same `key` every `seconds`, the number
+        of dropped messages is appended to the next one.
+
+        `key` defaults to `msg`, or to the code of a callable `msg`, so a lambda
+        created in a loop is always the same key.
+        Only the last `max_keys` keys are remembered.
+        """
+        if not self.__enabled(level):
+            return
+        key = _defaultKey(msg) if key is None else key
+        now = monotonic()
+        rate = self.__rate
+        last, suppressed = rate.get(key, (None, 0))
+        if last is not None and now - last < seconds:
+            rate[key] = (last, suppressed + 1)
+            rate.move_to_end(key)
+            return
+        rate[key] = (now, 0)
+        rate.move_to_end(key)
+        if len(rate) > self.max_keys:
+            rate.popitem(last=False)
+        if suppressed:
+            suffix = f" ({suppressed} similar messages suppressed)"
+            if callable(msg):
+                msg = _appendSuffix(msg, suffix)
+            else:
+                msg = f"{msg}{suffix}"
+        self.__emit(level, msg, args, kwargs)
+
+
+def _defaultKey(msg: Any) -> Hashable:
+    """
+    Key of a message for `log_once` / `log_every`.
+    """
+    if not callable(msg):
+        return msg
+    code = getattr(msg, "__code__", None)
+    if code is not None:
+        return code
+    # 其他可调用对象按调用位置区分
+    frame = sys._getframe(2)
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+def _appendSuffix(msg: Callable[[], Any], suffix: str) -> Callable[[], str]:
+    return lambda: f"{msg()}{suffix}"
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records untouched, formatting is left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _configure() -> None:
+    global _configured
+    if _configured:
+        return
+    with _config_lock:
+        if not _configured:
+            logging.basicConfig(
+                format=_format,
+                datefmt=_datefmt,
+                level=logging.INFO,
+                handlers=_handlers,
+            )
+            _configured = True
+
+
+def enableQueueLogging() -> None:
+    """
+    Move the root handlers behind a queue, records are then formatted and written
+    by a background thread. The queue is flushed at exit.
+
+    Arguments of a record are formatted later, so avoid mutating them after
+    logging.
+    """
+    global _listener
+    _configure()
+    with _config_lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger()
+        _queued_handlers[:] = root.handlers
+        for handler in _queued_handlers:
+            root.removeHandler(handler)
+        queue = SimpleQueue()
+        root.addHandler(_DeferredQueueHandler(queue))
+        _listener = QueueListener(queue, *_queued_handlers, respect_handler_level=True)
+        _listener.start()
+    atexit.register(disableQueueLogging)
+
+
+def disableQueueLogging() -> None:
+    """
+    Flush the queue, stop the background thread and restore the root handlers.
+    """
+    global _listener
+    with _config_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, _DeferredQueueHandler):
+                root.removeHandler(handler)
+        for handler in _queued_handlers:
+            root.addHandler(handler)
+        _queued_handlers.clear()
+    atexit.unregister(disableQueueLogging)
+
+
+def getLogger(
+    name: Optional[str] = None,
+    *,
+    mute: bool = False,
+    queue: bool = False,
+) -> "MutToneLogger":
+    """
+    Get a logger, the logging system is configured on the first call.
 
-def getLogger(name: Optional[str] = None, *, mute: bool = False) -> "MutToneLogger":
-    logging.basicConfig(
-        format=_format,
-        datefmt=_datefmt,
-        level=logging.INFO,
-        handlers=_handlers,
-    )
+    Parameters
+    ---
+        name : Name of the logger, root logger if None.
+        mute : Drop all messages.
+        queue : Use the background logging thread, see `enableQueueLogging`.
+    """
+    _configure()
+    if queue:
+        enableQueueLogging()
     logger = logging.getLogger(name)
     return MutToneLogger(logger, mute)
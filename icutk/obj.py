@@ -1,12 +1,117 @@
-from typing import Dict
+from typing import Any, ClassVar, Dict, Iterator, Optional
+from weakref import WeakValueDictionary
 
 __all__ = [
     "getSubClassDict",
+    "SubClassRegistry",
+    "AutoRegister",
 ]
 
 
-def getSubClassDict(cls, cls_dict: Dict[str, object] = {}) -> Dict[str, object]:
+def getSubClassDict(
+    cls, cls_dict: Optional[Dict[str, object]] = None
+) -> Dict[str, object]:
+    if cls_dict is None:
+        cls_dict = {}
     for subclass in cls.__subclasses__():
         cls_dict[subclass.__name__] = subclass
         getSubClassDict(subclass, cls_dict)
     return cls_dict
+
+
+class SubClassRegistry:
+    """
+    Name to class mapping filled as classes are defined, lookups are O(1).
+
+    Classes are held weakly, so classes created dynamically and dropped later
+    disappear from the registry. Registering another class under a taken name
+    raises `ValueError`, unless it is a redefinition (same module and qualified
+    name) which replaces the old class.
+
+    Parameters
+    ---
+        qualified : Key classes by `module.qualname` instead of `__name__`.
+    """
+
+    def __init__(self, qualified: bool = False) -> None:
+        self.qualified = qualified
+        self.__classes: "WeakValueDictionary[str, type]" = WeakValueDictionary()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self)!r})"
+
+    def key(self, cls: type) -> str:
+        if self.qualified:
+            return f"{cls.__module__}.{cls.__qualname__}"
+        return cls.__name__
+
+    def register(self, cls: type, name: Optional[str] = None) -> type:
+        """
+        Register `cls` under `name` (default: `key(cls)`), usable as a decorator.
+        """
+        key = self.key(cls) if name is None else name
+        old = self.__classes.get(key)
+        if (
+            old is not None
+            and old is not cls
+            and (old.__module__, old.__qualname__) != (cls.__module__, cls.__qualname__)
+        ):
+            raise ValueError(f"subclass name conflict - {key!r}: {old!r} and {cls!r}")
+        self.__classes[key] = cls
+        return cls
+
+    def unregister(self, name: str) -> None:
+        del self.__classes[name]
+
+    def __getitem__(self, name: str) -> type:
+        return self.__classes[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.__classes.get(name, default)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.__classes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.__classes.keys()))
+
+    def __len__(self) -> int:
+        return len(self.__classes)
+
+    def of(self, base: type) -> Dict[str, type]:
+        """
+        Registered subclasses of `base`, like `getSubClassDict(base)`.
+        """
+        return {
+            k: c
+            for k, c in list(self.__classes.items())
+            if c is not base and issubclass(c, base)
+        }
+
+
+class AutoRegister:
+    """
+    Base class whose subclasses register themselves.
+
+    A direct subclass of `AutoRegister` gets a new `registry`, its subclasses
+    at any depth are registered into it when they are defined.
+
+    >>> class Device(AutoRegister, qualified=False):
+    >>>     pass
+    >>> class Mos(Device):
+    >>>     pass
+    >>> class Res(Device, name="R"):
+    >>>     pass
+    >>> Device.registry["Mos"], Device.registry["R"]
+    """
+
+    registry: ClassVar[SubClassRegistry]
+
+    def __init_subclass__(
+        cls, qualified: bool = False, name: Optional[str] = None, **kwargs
+    ) -> None:
+        super().__init_subclass__(**kwargs)
+        if AutoRegister in cls.__bases__:
+            cls.registry = SubClassRegistry(qualified)
+        else:
+            cls.registry.register(cls, name)
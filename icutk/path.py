@@ -1,11 +1,14 @@
-from typing import Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from time import monotonic
 import os
 
 __all__ = [
     "abspath",
     "realpath",
     "expandpath",
+    "PathResolver",
 ]
 
 
@@ -19,3 +22,119 @@ def realpath(path: Union[str, Path]) -> Path:
 
 def expandpath(path: Union[str, Path]) -> Path:
     return Path(os.path.expanduser(os.path.expandvars(str(path))))
+
+
+class PathResolver:
+    """
+    Memoizing `realpath` / `expandpath` for large lists of paths.
+
+    Every resolved directory prefix is cached, so paths sharing a prefix cost
+    one `lstat` for their last component only. Entries expire after `ttl`
+    seconds (never if None), or are dropped explicitly with `invalidate`.
+
+    Parameters
+    ---
+        ttl : Lifetime of a cache entry in seconds, None for no expiry.
+        max_workers : Number of threads used by `resolve_many`.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_workers: int = 16) -> None:
+        if max_workers < 1:
+            raise ValueError(
+                f"max_workers should be a positive integer - {max_workers}"
+            )
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._resolved: Dict[str, Tuple[str, float]] = {}
+        self._expanded: Dict[str, Tuple[str, float]] = {}
+
+    def _get(self, cache: Dict[str, Tuple[str, float]], key: str) -> Optional[str]:
+        item = cache.get(key)
+        if item is None:
+            return None
+        if self.ttl is not None and monotonic() - item[1] >= self.ttl:
+            cache.pop(key, None)
+            return None
+        return item[0]
+
+    def _expand(self, path: str) -> str:
+        expanded = self._get(self._expanded, path)
+        if expanded is None:
+            expanded = os.path.expanduser(os.path.expandvars(path))
+            self._expanded[path] = (expanded, monotonic())
+        return expanded
+
+    def _resolve(self, path: str) -> str:
+        resolved = self._get(self._resolved, path)
+        if resolved is not None:
+            return resolved
+        parent, name = os.path.split(path)
+        if parent == path:
+            # 根目录
+            resolved = path
+        elif name in ("", "."):
+            resolved = self._resolve(parent)
+        elif name == "..":
+            resolved = os.path.dirname(self._resolve(parent))
+        else:
+            resolved = os.path.join(self._resolve(parent), name)
+            if os.path.islink(resolved):
+                resolved = os.path.realpath(resolved)
+        self._resolved[path] = (resolved, monotonic())
+        return resolved
+
+    def expand(self, path: Union[str, Path]) -> Path:
+        """
+        Same as `expandpath`, cached.
+        """
+        return Path(self._expand(str(path)))
+
+    def resolve(self, path: Union[str, Path], expand: bool = False) -> Path:
+        """
+        Same as `realpath` (non strict), cached per directory prefix.
+
+        Parameters
+        ---
+            path : Path to resolve.
+            expand : Expand env vars and `~` first.
+        """
+        path = str(path)
+        if expand:
+            path = self._expand(path)
+        return Path(self._resolve(os.path.join(os.getcwd(), path)))
+
+    def resolve_many(
+        self, paths: Iterable[Union[str, Path]], expand: bool = False
+    ) -> List[Path]:
+        """
+        Resolve many paths with a thread pool, results keep the order of `paths`.
+
+        Unique parent directories are resolved first, so threads do not race
+        on the same prefix.
+        """
+        paths = [str(path) for path in paths]
+        if expand:
+            paths = [self._expand(path) for path in paths]
+        # 不用 abspath, 它会在解析符号链接之前折叠 ".."
+        cwd = os.getcwd()
+        paths = [os.path.join(cwd, path) for path in paths]
+        parents = list(dict.fromkeys(os.path.dirname(path) for path in paths))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for _ in executor.map(self._resolve, parents):
+                pass
+            return [Path(resolved) for resolved in executor.map(self._resolve, paths)]
+
+    def invalidate(self, path: Union[str, Path, None] = None) -> None:
+        """
+        Drop cached entries of `path` and everything below it, or of all paths
+        if None. Expanded variables are only dropped by a full invalidation.
+        """
+        if path is None:
+            self._resolved.clear()
+            self._expanded.clear()
+            return
+        path = os.path.join(os.getcwd(), str(path))
+        prefix = os.path.join(path, "")
+        for key in list(self._resolved):
+            if key == path or key.startswith(prefix):
+                self._resolved.pop(key, None)
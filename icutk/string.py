@@ -1,10 +1,18 @@
-from typing import Any, Sequence, Union, Iterable, Optional
-from queue import LifoQueue
+from typing import Any, Sequence, Sized, Union, Iterable, Optional, List, Tuple
+from collections import deque
+from functools import lru_cache
+from array import array
+from pathlib import Path
+import mmap
 import re
 
 __all__ = [
     "evalToBasicType",
+    "evalSpiceValue",
+    "evalSpiceValues",
+    "PrefixMatcher",
     "startswith",
+    "LineIndex",
     "LineIterator",
 ]
 
@@ -35,27 +43,352 @@ def evalToBasicType(s: str) -> Union[str, int, float]:
     return value
 
 
+_SPICE_VALUE_RE = re.compile(
+    r"""
+    "(?P<dq>[^"]*)"
+    |'(?P<sq>[^']*)'
+    |(?P<num>[+-]?(?:\d+\.?\d*|\.\d+)(?P<exp>[eE][+-]?\d+)?)
+     (?P<scale>meg|mil|[tgkmunpfa])?[a-z]*
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+_SPICE_SCALES = {
+    "t": "e12",
+    "g": "e9",
+    "meg": "e6",
+    "k": "e3",
+    "m": "e-3",
+    "u": "e-6",
+    "n": "e-9",
+    "p": "e-12",
+    "f": "e-15",
+    "a": "e-18",
+}
+
+
+def _eval_spice_value(s: str) -> Union[str, int, float]:
+    if not isinstance(s, str):
+        raise TypeError("Input must be a string")
+    s = s.strip()
+    obj = _SPICE_VALUE_RE.fullmatch(s)
+    if obj is None:
+        return s
+    num, exp, scale = obj.group("num", "exp", "scale")
+    if num is None:
+        return s[1:-1]
+    if scale is None:
+        if exp is None and "." not in num:
+            return int(num)
+        return float(num)
+    scale = scale.lower()
+    if scale == "mil":
+        return float(num) * 25.4e-6
+    if exp is None:
+        return float(num + _SPICE_SCALES[scale])
+    return float(num) * float("1" + _SPICE_SCALES[scale])
+
+
+_eval_spice_value_cached = lru_cache(maxsize=1 << 16)(_eval_spice_value)
+
+
+def evalSpiceValue(s: str, cache: bool = False) -> Union[str, int, float]:
+    """
+    Evaluate a SPICE value to a basic type (str, int, float) in a single match.
+
+    Besides the forms of `evalToBasicType`, signs, exponents and scale suffixes
+    (t g meg k m u n p f a mil, case-insensitive, trailing unit letters ignored)
+    are understood, e.g. 600n -> 6e-07, 2.5meg -> 2500000.0, 10pF -> 1e-11.
+
+    Parameters
+    ---
+        s : String to evaluate.
+        cache : Look up repeated literals in an interning cache.
+    """
+    if cache:
+        return _eval_spice_value_cached(s)
+    return _eval_spice_value(s)
+
+
+def evalSpiceValues(
+    tokens: Iterable[str],
+    cache: bool = False,
+    numpy: bool = False,
+) -> Union[List[Union[str, int, float]], Any]:
+    """
+    Evaluate many SPICE values, see `evalSpiceValue`.
+
+    Parameters
+    ---
+        tokens : Strings to evaluate.
+        cache : Look up repeated literals in an interning cache.
+        numpy : Return a float64 NumPy array, all tokens should be numeric.
+    """
+    func = _eval_spice_value_cached if cache else _eval_spice_value
+    values = [func(t) for t in tokens]
+    if not numpy:
+        return values
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("NumPy is not installed.")
+    for v in values:
+        if isinstance(v, str):
+            raise ValueError(f"is not a numeric value - {v!r}")
+    return np.array(values, dtype=np.float64)
+
+
+class PrefixMatcher:
+    """
+    Compiled form of `startswith` patterns, reusable across calls.
+
+    Literal patterns are stored in a prefix trie, regex patterns are joined into
+    one alternation with a named group per pattern, so the matching cost does not
+    grow with the number of patterns.
+
+    Parameters
+    ---
+        patterns : Patterns to match the beginning of a string.
+        regex : Treat patterns as regular expressions.
+        case : Ignore case, only used by regex patterns.
+    """
+
+    __slots__ = ("patterns", "regex", "case", "__trie", "__regex", "__compiled")
+
+    def __init__(
+        self,
+        patterns: Sequence[str],
+        regex: bool = False,
+        case: bool = False,
+    ) -> None:
+        self.patterns = tuple(str(ptn) for ptn in patterns)
+        self.regex = regex
+        self.case = case
+        self.__trie: dict = {}
+        self.__regex: Optional[re.Pattern] = None
+        self.__compiled: Tuple[re.Pattern, ...] = ()
+        if regex:
+            flags = re.IGNORECASE if case else 0
+            self.__compiled = tuple(re.compile(p, flags) for p in self.patterns)
+            # 含捕获组的模式合并后组号会错位, 只能逐个匹配
+            if not any(compiled.groups for compiled in self.__compiled):
+                try:
+                    self.__regex = re.compile(
+                        "|".join(
+                            f"(?P<_p{i}>{ptn})" for i, ptn in enumerate(self.patterns)
+                        )
+                        or "(?!)",
+                        flags,
+                    )
+                except re.error:
+                    # patterns with inline flags
+                    pass
+        else:
+            for ptn in self.patterns:
+                node = self.__trie
+                for ch in ptn:
+                    node = node.setdefault(ch, {})
+                node.setdefault(None, ptn)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self.patterns)!r}, regex={self.regex})"
+
+    def __match_regex(self, string: str) -> Optional[Tuple[re.Match, str]]:
+        if self.__regex is not None:
+            # 合并的正则只用来找出命中的模式, 返回该模式自己的匹配结果
+            obj = self.__regex.match(string)
+            if obj:
+                i = int(obj.lastgroup[2:])
+                return self.__compiled[i].match(string), self.patterns[i]
+        else:
+            for ptn, compiled in zip(self.patterns, self.__compiled):
+                obj = compiled.match(string)
+                if obj:
+                    return obj, ptn
+        return None
+
+    def __match_literal(self, string: str) -> Optional[str]:
+        node = self.__trie
+        start, end = 0, len(string)
+        while start < end and string[start].isspace():
+            start += 1
+        for i in range(start, end):
+            if None in node:
+                break
+            node = node.get(string[i])
+            if node is None:
+                return None
+        return node.get(None)
+
+    def match(self, string: str) -> Union[re.Match, bool]:
+        """
+        Same result as `startswith`.
+        """
+        if self.regex:
+            hit = self.__match_regex(string)
+            return hit[0] if hit else False
+        return self.__match_literal(string) is not None
+
+    def which(self, string: str) -> Optional[str]:
+        """
+        Return the pattern that matched, None if nothing matched.
+        The shortest literal pattern wins, regex patterns are tried in order.
+        """
+        if self.regex:
+            hit = self.__match_regex(string)
+            return hit[1] if hit else None
+        return self.__match_literal(string)
+
+
+@lru_cache(maxsize=128)
+def _compile(patterns: Tuple[Any, ...], regex: bool, case: bool) -> PrefixMatcher:
+    return PrefixMatcher(patterns, regex=regex, case=case)
+
+
 def startswith(
     string: str,
-    patterns: Sequence[str],
+    patterns: Union[Sequence[str], PrefixMatcher],
     regex: bool = False,
     case: bool = False,
 ) -> Union[re.Match, bool]:
-    if regex:
-        flags = re.IGNORECASE if case else 0
-        for ptn in patterns:
-            obj = re.match(ptn, string, flags)
-            if obj:
-                return obj
-    else:
-        string = string.strip()
-        for ptn in patterns:
-            if string.startswith(str(ptn)):
-                return True
-    return False
+    """
+    Check if the string starts with any of the patterns.
+    A `PrefixMatcher` can be given as patterns to skip compiling.
+    """
+    if not isinstance(patterns, PrefixMatcher):
+        patterns = _compile(tuple(patterns), regex, case)
+    return patterns.match(string)
+
+
+_CHOMP_RE = re.compile(r"\n$")
+# LineIndex 建索引时每次扫描的字节数
+_INDEX_WINDOW = 64 << 20
+
+
+class LineIndex(Sequence[str]):
+    """
+    Memory-mapped file with a line start offset index, lines are decoded on demand.
+
+    The index is built on first use and can be shared by several `LineIterator`.
+
+    Parameters
+    ---
+        path : Path of the file.
+        encoding : Encoding used to decode lines.
+    """
+
+    def __init__(self, path: Union[str, Path], encoding: str = "utf-8") -> None:
+        self.path = Path(path)
+        self.encoding = encoding
+        self.__offsets: Optional[array] = None
+        with open(self.path, "rb") as f:
+            if self.path.stat().st_size > 0:
+                self.__mmap: Union[mmap.mmap, bytes] = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                self.__mmap = b""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({str(self.path)!r})"
+
+    @property
+    def offsets(self) -> array:
+        """
+        Start offset of every line, followed by the end offset of the last line.
+        """
+        if self.__offsets is None:
+            self.__offsets = self.__build()
+        return self.__offsets
+
+    def __build(self) -> array:
+        buf = self.__mmap
+        size = len(buf)
+        offsets = array("Q", [0])
+        try:
+            import numpy as np
+
+            # 分窗口扫描, 临时数组的大小不随文件增长
+            for start in range(0, size, _INDEX_WINDOW):
+                count = min(_INDEX_WINDOW, size - start)
+                window = np.frombuffer(buf, dtype=np.uint8, count=count, offset=start)
+                starts = np.flatnonzero(window == 0x0A) + (start + 1)
+                offsets.frombytes(starts.astype(np.uint64).tobytes())
+        except ImportError:
+            find = buf.find
+            pos = find(b"\n")
+            while pos != -1:
+                offsets.append(pos + 1)
+                pos = find(b"\n", pos + 1)
+        if offsets[-1] != size:
+            offsets.append(size)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError(f"line index out of range - {index}")
+        offsets = self.offsets
+        return self.__mmap[offsets[index] : offsets[index + 1]].decode(self.encoding)
+
+    def close(self) -> None:
+        if isinstance(self.__mmap, mmap.mmap):
+            self.__mmap.close()
+
+    def __enter__(self) -> "LineIndex":
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        self.close()
+
+
+class _IndexHistory(Sequence[str]):
+    """
+    History of a file-backed `LineIterator`, read back from its `LineIndex`.
+    """
+
+    def __init__(self, iterator: "LineIterator", window: Optional[int]) -> None:
+        self.iterator = iterator
+        self.window = window
+
+    def __len__(self) -> int:
+        if self.window is None:
+            return self.iterator.line
+        return min(self.iterator.line, self.window)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        length = len(self)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(length))]
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError(f"history index out of range - {index}")
+        return self.iterator._fetch(self.iterator.line - length + index)
 
 
 class LineIterator:
+    """
+    Line iterator with history, supporting `revert` and `peek_next`.
+
+    Parameters
+    ---
+        data : Lines to iterate over.
+        partition : Strip everything after this separator from returned lines.
+        chomp : Remove the trailing newline of each line.
+        stream : Pull lines lazily from `data` instead of loading them all up front.
+        window : Maximum number of consumed lines kept as history, unbounded if None.
+
+    A `LineIndex` as data (see `from_file`) is read on demand and supports `seek`.
+    """
+
     status: Any = None
 
     def __init__(
@@ -63,31 +396,107 @@ class LineIterator:
         data: Iterable[str],
         partition: Optional[str] = None,
         chomp: bool = False,
+        stream: bool = False,
+        window: Optional[int] = None,
     ) -> None:
         if not isinstance(data, Iterable):
             raise TypeError(f"data should be an iterable - {repr(data)}")
-        self.last: list = []
+        if window is not None and window < 1:
+            raise ValueError(f"window should be a positive integer - {window!r}")
+        self.last: Union[list, deque] = [] if window is None else deque(maxlen=window)
         self.last1: str = ""
         self.line: int = 0
         self.partition = partition
         self.chomp = chomp
-        self.__reg: LifoQueue = LifoQueue()
-        data_sequence = tuple(data)
-        self.total_lines = len(data_sequence)
-        self.__data_iter = iter(data_sequence)
+        self.__reg: list = []
+        self.__pulled: int = 0
+        self.__index: Optional[LineIndex] = None
+        if isinstance(data, LineIndex):
+            self.__index = data
+            self.last = _IndexHistory(self, window)
+        elif stream:
+            self.__total_lines = len(data) if isinstance(data, Sized) else None
+            self.__data_iter = iter(data)
+        else:
+            data_sequence = tuple(data)
+            self.__total_lines = len(data_sequence)
+            self.__data_iter = iter(data_sequence)
+
+    @classmethod
+    def from_file(
+        cls,
+        file: Union[str, Path, LineIndex],
+        partition: Optional[str] = None,
+        chomp: bool = False,
+        window: Optional[int] = None,
+        encoding: str = "utf-8",
+    ) -> "LineIterator":
+        """
+        Iterate over a memory-mapped file, pass a `LineIndex` to reuse its index.
+        """
+        if not isinstance(file, LineIndex):
+            file = LineIndex(file, encoding=encoding)
+        return cls(file, partition=partition, chomp=chomp, window=window)
 
     def __str__(self) -> str:
         return self.last1
 
     @property
-    def next(self) -> str:
-        if not self.__reg.empty():
-            data = self.__reg.get()
-        else:
+    def index(self) -> Optional[LineIndex]:
+        return self.__index
+
+    @property
+    def total_lines(self) -> Optional[int]:
+        """
+        Total number of lines, None while unknown in stream mode.
+        """
+        if self.__index is not None:
+            return len(self.__index)
+        return self.__total_lines
+
+    def _fetch(self, line_no: int) -> str:
+        data = self.__index[line_no]
+        if self.chomp:
+            data = _CHOMP_RE.sub("", data)
+        return data
+
+    def seek(self, line_no: int) -> None:
+        """
+        Move to `line_no`, the next line returned is the (line_no + 1)th line.
+        Only available for file-backed iterators.
+        """
+        if self.__index is None:
+            raise TypeError("seek is only supported by file-backed LineIterator")
+        if not 0 <= line_no <= len(self.__index):
+            raise ValueError(
+                f"Seek line {line_no} is out of range 0-{len(self.__index)}"
+            )
+        self.line = line_no
+        self.last1 = self._fetch(line_no - 1) if line_no > 0 else ""
+
+    def __pull(self) -> str:
+        if self.__index is not None:
+            if self.line >= len(self.__index):
+                raise StopIteration
+            return self._fetch(self.line)
+        if self.__reg:
+            return self.__reg.pop()
+        try:
             data = next(self.__data_iter)
-            if self.chomp:
-                data = re.sub(r"\n$", "", data)
-        self.last.append(data)
+        except StopIteration:
+            if self.__total_lines is None:
+                self.__total_lines = self.__pulled
+            raise
+        self.__pulled += 1
+        if self.chomp:
+            data = _CHOMP_RE.sub("", data)
+        return data
+
+    @property
+    def next(self) -> str:
+        data = self.__pull()
+        if self.__index is None:
+            self.last.append(data)
         self.last1 = data
         self.line += 1
         if self.partition:
@@ -96,8 +505,11 @@ class LineIterator:
 
     @property
     def peek_next(self) -> str:
-        data = self.next
-        self.revert(1)
+        data = self.__pull()
+        if self.__index is None:
+            self.__reg.append(data)
+        if self.partition:
+            data = data.partition(self.partition)[0]
         return data
 
     def revert(self, count: int = 1) -> None:
@@ -105,9 +517,11 @@ class LineIterator:
             raise ValueError(
                 f"Revert count {count} is greater than last line count {len(self.last)}"
             )
+        if self.__index is not None:
+            self.seek(self.line - count)
+            return
         for _ in range(count):
-            self.__reg.put(self.last1)
-            self.last.pop()
+            self.__reg.append(self.last.pop())
             if len(self.last) > 0:
                 self.last1 = self.last[-1]
             else:
@@ -1,31 +1,397 @@
-from typing import List, Optional, Union, Sequence
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+    Sequence,
+)
 from subprocess import Popen as _Popen, PIPE, TimeoutExpired, CompletedProcess
 from abc import ABC, abstractmethod
-from queue import Queue
-from threading import Thread, Event
-from time import sleep
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from queue import Queue, Empty
+from threading import Thread, Condition, Event, Lock, current_thread
+from contextlib import contextmanager
+from functools import partial
+from time import monotonic
+from uuid import uuid4
+from tempfile import NamedTemporaryFile, TemporaryFile
+from pathlib import Path
+import asyncio
+import codecs
+import io
+import locale
+import os
+import re
+import selectors
 import sys
 
-from .string import startswith
-
-if sys.platform == "win32":
-    from select import select
-else:
-    from fcntl import F_GETFL, F_SETFL, fcntl
-    from os import O_NONBLOCK
+from .string import PrefixMatcher
 
 __all__ = [
     "Popen",
+    "AsyncPopen",
+    "PopenPool",
     "Disposable",
+    "runDisposables",
 ]
 
 
+class _Multiplexer:
+    """
+    Watch the output pipes of all `Popen` from one thread.
+
+    The thread sleeps in the selector until a pipe is readable, registration
+    changes are handed over through a wake-up pipe and run in the thread itself.
+    """
+
+    chunk_size = 1 << 16
+
+    def __init__(self) -> None:
+        self.selector = selectors.DefaultSelector()
+        self.lock = Lock()
+        self.thread: Optional[Thread] = None
+        self.pending: list = []
+        self.paused: dict = {}
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(self.wakeup_w, False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+
+    def register(self, fd: int, callback: Callable[[bytes], None]) -> None:
+        """
+        `callback` receives every chunk read from `fd`, and b"" at EOF.
+        """
+        os.set_blocking(fd, False)
+        self.call(self.__register, fd, callback)
+
+    def __register(self, fd: int, callback: Callable[[bytes], None]) -> None:
+        # fd 号可能被复用, 之前关闭但未注销的旧注册作废
+        self.discard(fd)
+        self.selector.register(fd, selectors.EVENT_READ, callback)
+
+    def unregister(self, fd: int) -> None:
+        self.call(self.discard, fd)
+
+    def discard(self, fd: int) -> None:
+        self.paused.pop(fd, None)
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+
+    def pause(self, fd: int) -> None:
+        """
+        Stop reading `fd` until `resume`, called from the callback of `fd`.
+        """
+        try:
+            self.paused[fd] = self.selector.unregister(fd).data
+        except (KeyError, ValueError):
+            pass
+
+    def resume(self, fd: int) -> None:
+        """
+        Continue reading a paused `fd`, does not wait so it is safe under locks.
+        """
+        self.call(self.__resume, fd, wait=False)
+
+    def __resume(self, fd: int) -> None:
+        callback = self.paused.pop(fd, None)
+        if callback is not None:
+            self.selector.register(fd, selectors.EVENT_READ, callback)
+
+    def call(self, func: Callable, *args, wait: bool = True) -> None:
+        """
+        Run `func` in the thread, exceptions are raised here if `wait` is True.
+        """
+        if current_thread() is self.thread:
+            func(*args)
+            return
+        done = Event()
+        errors: list = []
+        with self.lock:
+            self.pending.append((func, args, done, errors))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+        try:
+            os.write(self.wakeup_w, b"\0")
+        except BlockingIOError:
+            pass
+        if wait:
+            done.wait()
+            if errors:
+                raise errors[0]
+
+    def run(self) -> None:
+        while True:
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    self.flush_pending()
+                    continue
+                try:
+                    data = os.read(key.fd, self.chunk_size)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    self.discard(key.fd)
+                # 一个回调出错只放弃它自己的 fd, 线程还要服务其他进程
+                try:
+                    key.data(data)
+                except Exception:
+                    self.discard(key.fd)
+
+    def flush_pending(self) -> None:
+        try:
+            while os.read(self.wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for func, args, done, errors in pending:
+            # 异常交还给调用方, 线程本身不能退出
+            try:
+                func(*args)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+
+class _LineQueue(Queue):
+    """
+    Output line queue which can be closed at EOF to wake up waiting readers.
+
+    With a positive `limit`, `overflow` decides what happens once `limit` lines
+    are buffered:
+        block : Mark the queue `full` until half of it is consumed, the reader
+            stops reading the pipe meanwhile so the process blocks on writing.
+        drop : Drop the oldest lines, counted in `dropped`.
+        spill : Append further lines to a temporary file, read back in order.
+    """
+
+    def __init__(
+        self,
+        limit: int = 0,
+        overflow: Literal["block", "drop", "spill"] = "block",
+    ) -> None:
+        if overflow not in ("block", "drop", "spill"):
+            raise ValueError(f"unknown overflow policy - {overflow!r}")
+        super().__init__()
+        self.closed = False
+        self.limit = limit
+        self.overflow = overflow
+        self.full = False
+        self.dropped = 0
+        self.on_room: Optional[Callable[[], None]] = None
+        self.__spill = None
+        self.__spilled = 0
+        self.__spill_pos = 0
+        self.__partial = False
+
+    def _qsize(self) -> int:
+        return len(self.queue) + self.__spilled
+
+    def _put(self, item: str) -> None:
+        queue = self.queue
+        if self.limit <= 0:
+            queue.append(item)
+        elif self.overflow == "drop":
+            queue.append(item)
+            if len(queue) > self.limit:
+                queue.popleft()
+                self.dropped += 1
+        elif self.overflow == "spill":
+            if self.__spilled or len(queue) >= self.limit:
+                self.__spillWrite(item)
+            else:
+                queue.append(item)
+        else:
+            queue.append(item)
+            if len(queue) >= self.limit:
+                self.full = True
+
+    def _get(self) -> str:
+        if self.__spilled and len(self.queue) < self.limit:
+            self.__spillRead()
+        item = self.queue.popleft()
+        if self.full and len(self.queue) <= self.limit // 2:
+            self.full = False
+            if self.on_room is not None:
+                self.on_room()
+        return item
+
+    def __spillWrite(self, item: str) -> None:
+        if self.__spill is None:
+            self.__spill = TemporaryFile("w+b")
+        self.__spill.seek(0, os.SEEK_END)
+        self.__spill.write(item.encode("utf-8", "surrogateescape"))
+        if not item.endswith("\n"):
+            # only the last line at EOF can be partial
+            self.__spill.write(b"\n")
+            self.__partial = True
+        self.__spilled += 1
+
+    def __spillRead(self) -> None:
+        spill = self.__spill
+        spill.seek(self.__spill_pos)
+        while self.__spilled and len(self.queue) < self.limit:
+            line = spill.readline().decode("utf-8", "surrogateescape")
+            self.__spilled -= 1
+            if self.__spilled == 0 and self.__partial:
+                line = line[:-1]
+                self.__partial = False
+            self.queue.append(line)
+        self.__spill_pos = spill.tell()
+        if not self.__spilled:
+            spill.seek(0)
+            spill.truncate()
+            self.__spill_pos = 0
+
+    def put_lines(self, lines: List[str]) -> bool:
+        """
+        Put many lines at once, return True if the queue is `full`.
+        """
+        with self.mutex:
+            for line in lines:
+                self._put(line)
+            self.unfinished_tasks += len(lines)
+            self.not_empty.notify_all()
+            return self.full
+
+    def wait_room(self) -> None:
+        """
+        Wait until the queue is no longer `full`.
+        """
+        with self.not_full:
+            while self.full and not self.closed:
+                self.not_full.wait()
+
+    def close(self) -> None:
+        with self.mutex:
+            self.closed = True
+            self.not_empty.notify_all()
+
+    def pop(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Like `get`, but return None once closed and drained.
+        """
+        with self.not_empty:
+            if timeout is None:
+                while not self._qsize() and not self.closed:
+                    self.not_empty.wait()
+            else:
+                deadline = monotonic() + timeout
+                while not self._qsize() and not self.closed:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            if not self._qsize():
+                return None
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+
+_multiplexer: Optional[_Multiplexer] = None
+_multiplexer_lock = Lock()
+
+
+def _getMultiplexer() -> _Multiplexer:
+    global _multiplexer
+    with _multiplexer_lock:
+        if _multiplexer is None:
+            _multiplexer = _Multiplexer()
+        return _multiplexer
+
+
+class _Receiver:
+    """
+    Collect output lines from `heads` up to `targets`, shared by `Popen.recv`
+    and `AsyncPopen.recv`.
+    """
+
+    def __init__(
+        self,
+        targets: Union[str, Sequence[str], PrefixMatcher],
+        heads: Union[str, list, PrefixMatcher, None],
+        targets_regex: bool,
+        targets_case: bool,
+        heads_regex: bool,
+        heads_case: bool,
+    ) -> None:
+        if targets is None:
+            raise ValueError("targets is None")
+        elif isinstance(targets, PrefixMatcher):
+            pass
+        elif isinstance(targets, str):
+            targets = PrefixMatcher([targets], targets_regex, targets_case)
+        elif isinstance(targets, Sequence):
+            targets = PrefixMatcher(targets, targets_regex, targets_case)
+        else:
+            targets = PrefixMatcher([targets], targets_regex, targets_case)
+        if len(targets.patterns) < 1:
+            raise ValueError("targets is empty")
+
+        if heads is not None:
+            if isinstance(heads, PrefixMatcher):
+                pass
+            elif isinstance(heads, str):
+                heads = PrefixMatcher([heads], heads_regex, heads_case)
+            elif isinstance(heads, list):
+                heads = PrefixMatcher(heads, heads_regex, heads_case)
+            else:
+                raise ValueError("heads is not str or list")
+
+        self.targets: PrefixMatcher = targets
+        self.heads: Optional[PrefixMatcher] = heads
+        self.result: List[str] = []
+
+    @property
+    def output(self) -> str:
+        return "".join(self.result)
+
+    def feed(self, line: str) -> bool:
+        """
+        Return True once the target line is received.
+        """
+        if self.heads is not None:
+            if not self.heads.match(line):
+                return False
+            self.heads = None
+        self.result.append(line)
+        return bool(self.targets.match(line))
+
+
 class Popen(_Popen):
     """
     用于交互式进程。
+
+    Parameters
+    ---
+        args : Command, a string is run through the shell.
+        verbose : Print the output lines as they are received.
+        buffer_size : Maximum number of lines buffered per output queue, 0 for
+            unbounded.
+        overflow : What to do when a queue holds `buffer_size` lines, "block" stops
+            reading the pipe, "drop" drops the oldest lines and "spill" moves
+            further lines to a temporary file.
     """
 
-    def __init__(self, args: Union[Sequence, str], verbose: bool = False) -> None:
+    def __init__(
+        self,
+        args: Union[Sequence, str],
+        verbose: bool = False,
+        buffer_size: int = 0,
+        overflow: Literal["block", "drop", "spill"] = "block",
+    ) -> None:
         self._config = {}
         self.verbose = verbose
         if isinstance(args, str):
@@ -42,54 +408,81 @@ class Popen(_Popen):
             stdout=PIPE,
             stderr=PIPE,
             text=True,
+            errors="replace",
             bufsize=1,
         )
         if self.poll() is not None:
             raise ChildProcessError("Process failed to start")
 
-        def reader(self: __class__, handleType: str) -> None:
-            def oneline(res: str):
-                if res != "":
-                    queue.put(res)
-                    if self.verbose:
-                        end = "" if res.endswith("\n") else "\n"
-                        print(f"{handleType}: {res}", end=end)
-
-            handle = getattr(self, handleType)
-            queue = getattr(self, f"{handleType}_queue")
+        self._config["stdout_queue"] = _LineQueue(buffer_size, overflow)
+        self._config["stderr_queue"] = _LineQueue(buffer_size, overflow)
+        self._config["thread_event"] = Event()
+        if sys.platform == "win32":
+            # selectors only support sockets on Windows
+            for handleType in ("stdout", "stderr"):
+                self._config[f"{handleType}_thread"] = Thread(
+                    target=self.__reader, args=(handleType,), daemon=True
+                )
+                self._config[f"{handleType}_thread"].start()
+        else:
+            mux = _getMultiplexer()
+            for handleType in ("stdout", "stderr"):
+                fd = getattr(self, handleType).fileno()
+                self._config[f"{handleType}_queue"].on_room = partial(mux.resume, fd)
+                mux.register(fd, self.__feeder(handleType, fd))
+                self._config[f"{handleType}_thread"] = mux.thread
 
-            if sys.platform == "linux":
-                flags = fcntl(handle, F_GETFL)
-                fcntl(handle, F_SETFL, flags | O_NONBLOCK)
+    def __putlines(self, handleType: str, lines: List[str]) -> bool:
+        if self.verbose:
+            for res in lines:
+                end = "" if res.endswith("\n") else "\n"
+                print(f"{handleType}: {res}", end=end)
+        return self._config[f"{handleType}_queue"].put_lines(lines)
 
-            while True:
-                if self.thread_event.is_set():
-                    break
-                if handle.closed:
-                    break
+    def __reader(self, handleType: str) -> None:
+        handle = getattr(self, handleType)
+        queue = self._config[f"{handleType}_queue"]
+        while not self.thread_event.is_set() and not handle.closed:
+            try:
+                res = handle.readline()
+            except ValueError:
+                break
+            if res == "":
+                break
+            if self.__putlines(handleType, [res]):
+                queue.wait_room()
+        queue.close()
 
-                if sys.platform == "win32":
-                    read, _, _ = select([handle], [], [], 0.1)
-                    if not read:
-                        continue
+    def __feeder(self, handleType: str, fd: int) -> Callable[[bytes], None]:
+        handle = getattr(self, handleType)
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(handle.encoding)(handle.errors),
+            translate=True,
+        )
+        rest = ""
 
-                if self.poll() is not None:
-                    map(oneline, handle.readlines())
-                    break
-                oneline(handle.readline())
-            return
+        def feed(data: bytes) -> None:
+            nonlocal rest
+            final = data == b""
+            try:
+                lines = (rest + decoder.decode(data, final=final)).split("\n")
+                rest = lines.pop()
+                lines = [line + "\n" for line in lines]
+                if final:
+                    if rest:
+                        lines.append(rest)
+                    rest = ""
+                if lines and self.__putlines(handleType, lines) and not final:
+                    _getMultiplexer().pause(fd)
+            except BaseException:
+                # 读不下去了, 关闭队列让等待输出的调用方醒来
+                final = True
+                raise
+            finally:
+                if final:
+                    self._config[f"{handleType}_queue"].close()
 
-        self._config["stdout_queue"] = Queue()
-        self._config["stderr_queue"] = Queue()
-        self._config["thread_event"] = Event()
-        self._config["stdout_thread"] = Thread(
-            target=reader, args=(self, "stdout"), daemon=True
-        )
-        self._config["stderr_thread"] = Thread(
-            target=reader, args=(self, "stderr"), daemon=True
-        )
-        self.stdout_thread.start()
-        self.stderr_thread.start()
+        return feed
 
     @property
     def verbose(self) -> bool:
@@ -100,11 +493,11 @@ class Popen(_Popen):
         self._config["verbose"] = True if value else False
 
     @property
-    def stdout_queue(self) -> Queue:
+    def stdout_queue(self) -> _LineQueue:
         return self._config["stdout_queue"]
 
     @property
-    def stderr_queue(self) -> Queue:
+    def stderr_queue(self) -> _LineQueue:
         return self._config["stderr_queue"]
 
     @property
@@ -119,12 +512,28 @@ class Popen(_Popen):
     def stderr_thread(self) -> Thread:
         return self._config["stderr_thread"]
 
+    def __unregister(self) -> None:
+        """
+        Stop watching the output pipes, must run before they are closed.
+        """
+        if sys.platform != "win32":
+            mux = _getMultiplexer()
+            for handle in (self.stdout, self.stderr):
+                if handle and not handle.closed:
+                    mux.unregister(handle.fileno())
+        self.stdout_queue.close()
+        self.stderr_queue.close()
+
+    def __exit__(self, *args, **kwargs):
+        self.thread_event.set()
+        self.__unregister()
+        return super().__exit__(*args, **kwargs)
+
     def stop(self, timeout: int = 300) -> None:
+        self.thread_event.set()
+        self.__unregister()
         if self.poll() is not None:
             return
-        self.thread_event.set()
-        self.stdout_thread.join()
-        self.stderr_thread.join()
         if self.stdin and not self.stdin.closed:
             self.stdin.close()
         if self.stdout and not self.stdout.closed:
@@ -154,56 +563,425 @@ class Popen(_Popen):
         stdin.flush()
         return cmd
 
+    def batch(
+        self,
+        commands: Iterable[Union[str, Sequence[Union[str, int, float]]]],
+        sentinel: str = "echo {}",
+        timeout: Optional[float] = None,
+        prompt: Optional[str] = None,
+    ) -> List[List[str]]:
+        """
+        Send all commands in one write and split the output per command.
+
+        Every command is followed by `sentinel` formatted with a unique marker,
+        the tool should print a line holding only the marker when it runs it,
+        e.g. `printf("{}\\n")` for SKILL. The marker may follow `prompt`, lines
+        which merely contain the marker, such as an echo of the sentinel command,
+        are dropped from the results.
+
+        Parameters
+        ---
+            commands : Commands to send, a sequence is joined like `send`.
+            sentinel : Command printing the marker, `{}` is replaced by the marker.
+            timeout : Seconds to wait for all results, see `recv`.
+            prompt : Regex of the prompt printed by the tool, removed from the
+                start of every output line.
+
+        Return the stdout lines of every command, without the marker lines.
+        """
+        stdin = self.stdin
+        if stdin is None or stdin.closed:
+            raise BrokenPipeError("stdin is closed")
+        prefix = f"__icutk_{uuid4().hex}_"
+        markers = []
+        buf = []
+        for i, cmd in enumerate(commands):
+            if not isinstance(cmd, str):
+                cmd = " ".join(map(str, cmd))
+            markers.append(f"{prefix}{i}__")
+            buf.append(cmd + "\n")
+            buf.append(sentinel.format(markers[-1]) + "\n")
+        stdin.write("".join(buf))
+        stdin.flush()
+
+        prompt_re = None if prompt is None else re.compile(f"^(?:{prompt})+")
+        leading = "" if prompt is None else f"(?:{prompt})*"
+        deadline = None if timeout is None else monotonic() + timeout
+        results = []
+        for marker in markers:
+            if deadline is not None:
+                timeout = max(deadline - monotonic(), 0)
+            # 标记必须独占一行 (可带提示符), 回显的哨兵命令不算
+            matcher = PrefixMatcher(
+                [f"{leading}{re.escape(marker)}\\s*$"], regex=True, case=True
+            )
+            lines = self.recv(matcher, timeout=timeout)[:-1]
+            lines = [line for line in lines if marker not in line]
+            if prompt_re is not None:
+                lines = [prompt_re.sub("", line, count=1) for line in lines]
+            results.append(lines)
+        return results
+
     def recv(
         self,
-        targets: Union[str, Sequence[str]],
-        heads: Optional[list] = None,
+        targets: Union[str, Sequence[str], PrefixMatcher],
+        heads: Union[str, list, PrefixMatcher, None] = None,
         targets_regex: bool = False,
         targets_case: bool = False,
         heads_regex: bool = False,
         heads_case: bool = False,
+        timeout: Optional[float] = None,
     ) -> List[str]:
-        if targets is None:
-            raise ValueError("targets is None")
-        elif isinstance(targets, Sequence):
-            targets = list(targets)
+        """
+        Receive stdout lines until one starts with `targets`, lines before
+        `heads` (if given) are dropped. Return as soon as the target line arrives.
+
+        Raise `TimeoutExpired` with the lines received so far if it takes longer
+        than `timeout` seconds, `ChildProcessError` if stdout reaches EOF first.
+        """
+        receiver = _Receiver(
+            targets, heads, targets_regex, targets_case, heads_regex, heads_case
+        )
+        q = self.stdout_queue
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            try:
+                if deadline is None:
+                    line = q.pop()
+                else:
+                    line = q.pop(timeout=max(deadline - monotonic(), 0))
+            except Empty:
+                raise TimeoutExpired(self.args, timeout, output=receiver.output)
+            if line is None:
+                raise ChildProcessError("stdout closed before target was received")
+            q.task_done()
+            if receiver.feed(line):
+                return receiver.result
+
+
+class AsyncPopen:
+    """
+    asyncio 版本的交互式进程，用法与 `Popen` 一致。
+
+    >>> async with AsyncPopen(["bash"]) as proc:
+    >>>     await proc.send("echo done")
+    >>>     await proc.recv("done", timeout=10)
+    """
+
+    def __init__(self, args: Union[Sequence, str], verbose: bool = False) -> None:
+        if isinstance(args, str):
+            self.shell = True
+        elif isinstance(args, Sequence):
+            self.shell = False
+            args = tuple(map(str, args))
         else:
-            targets = [targets]
-        if len(targets) < 1:
-            raise ValueError("targets is empty")
+            raise TypeError("args must be a sequence or a string")
+        self.args = args
+        self.verbose = verbose
+        self.encoding = locale.getpreferredencoding(False)
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.stdout_queue: Optional[asyncio.Queue] = None
+        self.stderr_queue: Optional[asyncio.Queue] = None
+        self.__tasks: List[asyncio.Task] = []
 
-        if heads is not None:
-            if isinstance(heads, str):
-                heads = [heads]
-            elif isinstance(heads, list):
+    async def __aenter__(self) -> "AsyncPopen":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args, **kwargs) -> None:
+        await self.stop()
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return None if self.process is None else self.process.returncode
+
+    async def start(self) -> None:
+        if self.process is not None:
+            raise RuntimeError("Process already started")
+        kwargs = {"stdin": PIPE, "stdout": PIPE, "stderr": PIPE}
+        if self.shell:
+            self.process = await asyncio.create_subprocess_shell(self.args, **kwargs)
+        else:
+            self.process = await asyncio.create_subprocess_exec(*self.args, **kwargs)
+        self.stdout_queue = asyncio.Queue()
+        self.stderr_queue = asyncio.Queue()
+        self.__tasks = [
+            asyncio.ensure_future(self.__reader("stdout")),
+            asyncio.ensure_future(self.__reader("stderr")),
+        ]
+
+    async def __reader(self, handleType: str) -> None:
+        stream = getattr(self.process, handleType)
+        queue = getattr(self, f"{handleType}_queue")
+        # readline 受 StreamReader 的 limit 限制, 按块读取再自行分行
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self.encoding)("replace"), translate=True
+        )
+        rest = ""
+        try:
+            while True:
+                data = await stream.read(1 << 16)
+                final = data == b""
+                lines = (rest + decoder.decode(data, final=final)).split("\n")
+                rest = lines.pop()
+                lines = [line + "\n" for line in lines]
+                if final and rest:
+                    lines.append(rest)
+                for res in lines:
+                    queue.put_nowait(res)
+                    if self.verbose:
+                        end = "" if res.endswith("\n") else "\n"
+                        print(f"{handleType}: {res}", end=end)
+                if final:
+                    break
+        finally:
+            # None marks EOF
+            queue.put_nowait(None)
+
+    async def stop(self, timeout: int = 300) -> None:
+        proc = self.process
+        if proc is None:
+            return
+        if proc.stdin and not proc.stdin.is_closing():
+            proc.stdin.close()
+        if proc.returncode is None:
+            try:
+                proc.terminate()
+                await asyncio.wait_for(proc.wait(), timeout)
+            except ProcessLookupError:
                 pass
-            else:
-                raise ValueError("heads is not str or list")
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
 
+    async def send(self, *args: Union[str, int, float]) -> str:
+        cmd = " ".join(map(str, args))
+        stdin = None if self.process is None else self.process.stdin
+        if stdin is None or stdin.is_closing():
+            raise BrokenPipeError("stdin is closed")
+        stdin.write((cmd + "\n").encode(self.encoding))
+        await stdin.drain()
+        return cmd
+
+    async def recv(
+        self,
+        targets: Union[str, Sequence[str], PrefixMatcher],
+        heads: Union[str, list, PrefixMatcher, None] = None,
+        targets_regex: bool = False,
+        targets_case: bool = False,
+        heads_regex: bool = False,
+        heads_case: bool = False,
+        timeout: Optional[float] = None,
+    ) -> List[str]:
+        """
+        See `Popen.recv`.
+        """
+        receiver = _Receiver(
+            targets, heads, targets_regex, targets_case, heads_regex, heads_case
+        )
         q = self.stdout_queue
 
-        if heads is not None:
+        async def collect() -> List[str]:
             while True:
-                if q.empty():
-                    sleep(0.1)
+                line = await q.get()
+                if line is None:
+                    q.put_nowait(None)
+                    raise ChildProcessError("stdout closed before target was received")
+                if receiver.feed(line):
+                    return receiver.result
+
+        try:
+            return await asyncio.wait_for(collect(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutExpired(self.args, timeout, output=receiver.output)
+
+
+class PopenPool:
+    """
+    交互式进程池，复用已启动的 `Popen` 以省去启动开销。
+
+    >>> with PopenPool(["bash"], max_size=4, probe=("echo ok", "ok")) as pool:
+    >>>     with pool.session() as proc:
+    >>>         proc.send("echo done")
+    >>>         proc.recv("done")
+
+    Parameters
+    ---
+        args : Command of the sessions, see `Popen`.
+        max_size : Maximum number of sessions, idle or checked out.
+        min_size : Number of sessions started up front and kept warm.
+        probe : `(command, target)` sent on checkout to check the session is alive.
+        probe_timeout : Seconds to wait for the probe target.
+        max_idle : Seconds after which an idle session is stopped, None to keep it.
+        verbose : See `Popen`.
+    """
+
+    def __init__(
+        self,
+        args: Union[Sequence, str],
+        max_size: int = 4,
+        min_size: int = 0,
+        probe: Optional[Tuple[str, str]] = None,
+        probe_timeout: float = 10,
+        max_idle: Optional[float] = None,
+        verbose: bool = False,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError(f"max_size should be a positive integer - {max_size}")
+        if not 0 <= min_size <= max_size:
+            raise ValueError(f"min_size should be between 0 and max_size - {min_size}")
+        self.args = args
+        self.max_size = max_size
+        self.min_size = min_size
+        self.probe = probe
+        self.probe_timeout = probe_timeout
+        self.max_idle = max_idle
+        self.verbose = verbose
+        self.__cond = Condition()
+        self.__idle: List[Tuple[Popen, float]] = []
+        self.__total = 0
+        self.__closed = False
+        for _ in range(min_size):
+            self.__total += 1
+            self.__idle.append((self.__spawn(), monotonic()))
+
+    def __enter__(self) -> "PopenPool":
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        self.close()
+
+    @property
+    def size(self) -> int:
+        """
+        Number of sessions, idle or checked out.
+        """
+        return self.__total
+
+    @property
+    def idle(self) -> int:
+        return len(self.__idle)
+
+    def __spawn(self) -> Popen:
+        return Popen(self.args, verbose=self.verbose)
+
+    def __healthy(self, proc: Popen) -> bool:
+        if proc.poll() is not None:
+            return False
+        if self.probe is None:
+            return True
+        command, target = self.probe
+        try:
+            proc.send(command)
+            proc.recv(target, timeout=self.probe_timeout)
+        except (TimeoutExpired, ChildProcessError, OSError):
+            return False
+        return True
+
+    def __discard(self, proc: Popen) -> None:
+        proc.stop()
+        with self.__cond:
+            self.__total -= 1
+            self.__cond.notify()
+
+    def __expired(self) -> List[Popen]:
+        """
+        Take out sessions idle for longer than `max_idle`, called with the lock held.
+        """
+        expired = []
+        if self.max_idle is None:
+            return expired
+        now = monotonic()
+        for item in list(self.__idle):
+            if self.__total <= self.min_size:
+                break
+            if now - item[1] > self.max_idle:
+                self.__idle.remove(item)
+                self.__total -= 1
+                expired.append(item[0])
+        return expired
+
+    def checkout(self, timeout: Optional[float] = None) -> Popen:
+        """
+        Take a session out of the pool, starting a new one if none is idle.
+        Raise `TimeoutError` if no session is available within `timeout` seconds.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            proc = None
+            with self.__cond:
+                if self.__closed:
+                    raise RuntimeError("pool is closed")
+                expired = self.__expired()
+                if self.__idle:
+                    proc = self.__idle.pop()[0]
+                elif self.__total < self.max_size:
+                    self.__total += 1
+                else:
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("no session available in the pool")
+                    self.__cond.wait(remaining)
                     continue
-                line = q.queue[0]
-                if startswith(line, heads, regex=heads_regex, case=heads_case):
+            for old in expired:
+                old.stop()
+            if proc is None:
+                try:
+                    return self.__spawn()
+                except Exception:
+                    with self.__cond:
+                        self.__total -= 1
+                        self.__cond.notify()
+                    raise
+            if self.__healthy(proc):
+                return proc
+            self.__discard(proc)
+
+    def checkin(self, proc: Popen) -> None:
+        """
+        Return a session to the pool, output left in its queues is dropped.
+        """
+        for q in (proc.stdout_queue, proc.stderr_queue):
+            while True:
+                try:
+                    q.get_nowait()
+                except Empty:
                     break
-                q.get(timeout=1)
-                q.task_done()
+        if proc.poll() is not None:
+            self.__discard(proc)
+            return
+        with self.__cond:
+            if not self.__closed:
+                self.__idle.append((proc, monotonic()))
+                self.__cond.notify()
+                return
+        self.__discard(proc)
 
-        result = []
-        while True:
-            if q.empty():
-                sleep(0.1)
-                continue
-            line = q.get()
-            result.append(line)
-            q.task_done()
-            if startswith(line, targets, regex=targets_regex, case=targets_case):
-                break
-        return result
+    @contextmanager
+    def session(self, timeout: Optional[float] = None) -> Iterator[Popen]:
+        proc = self.checkout(timeout)
+        try:
+            yield proc
+        except BaseException:
+            # state of the session is unknown
+            self.__discard(proc)
+            raise
+        else:
+            self.checkin(proc)
+
+    def close(self) -> None:
+        """
+        Stop idle sessions, sessions still checked out are stopped on checkin.
+        """
+        with self.__cond:
+            self.__closed = True
+            idle, self.__idle = self.__idle, []
+            self.__cond.notify_all()
+        for proc, _ in idle:
+            self.__discard(proc)
 
 
 class Disposable(ABC):
@@ -213,23 +991,57 @@ class Disposable(ABC):
 
     __slots__ = ("__config",)
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        spool: bool = False,
+        stdout_file: Union[str, Path, None] = None,
+        stderr_file: Union[str, Path, None] = None,
+        tail: int = 0,
+    ) -> None:
+        """
+        Parameters
+        ---
+            spool : Write stdout and stderr to temporary files instead of memory,
+                `stdout` and `stderr` are then the paths of these files.
+            stdout_file : Spool stdout to this file, implies `spool`.
+            stderr_file : Spool stderr to this file, implies `spool`.
+            tail : Keep the last `tail` lines of spooled output in memory, see
+                `stdout_tail` and `stderr_tail`.
+        """
         self.__config = {
             "stdout": None,
             "stderr": None,
             "started": False,
             "process": None,
             "returncode": None,
+            "spool": spool or stdout_file is not None or stderr_file is not None,
+            "spool_files": {"stdout": stdout_file, "stderr": stderr_file},
+            "spool_temps": [],
+            "tail": tail,
+            "stdout_tail": [],
+            "stderr_tail": [],
         }
 
     @property
-    def stdout(self) -> Optional[str]:
+    def stdout(self) -> Union[str, Path, None]:
         return self.__config["stdout"]
 
     @property
-    def stderr(self) -> Optional[str]:
+    def stderr(self) -> Union[str, Path, None]:
         return self.__config["stderr"]
 
+    @property
+    def spool(self) -> bool:
+        return self.__config["spool"]
+
+    @property
+    def stdout_tail(self) -> List[str]:
+        return self.__config["stdout_tail"]
+
+    @property
+    def stderr_tail(self) -> List[str]:
+        return self.__config["stderr_tail"]
+
     @property
     def started(self) -> bool:
         return self.__config["started"]
@@ -329,7 +1141,17 @@ class Disposable(ABC):
                 }
             )
             self.begin_before()
-            self.__config["process"] = _Popen(**kwargs)
+            if self.spool:
+                handles = self.__openSpool()
+                kwargs.update(handles)
+                try:
+                    self.__config["process"] = _Popen(**kwargs)
+                finally:
+                    # the child process holds its own copies
+                    for handle in handles.values():
+                        handle.close()
+            else:
+                self.__config["process"] = _Popen(**kwargs)
             self.__config["started"] = True
             self.begin_after()
         else:
@@ -351,10 +1173,53 @@ class Disposable(ABC):
         """
         pass
 
+    def __openSpool(self) -> dict:
+        handles = {}
+        for handleType, file in self.__config["spool_files"].items():
+            if file is None:
+                handle = NamedTemporaryFile(
+                    prefix="icutk-", suffix=f".{handleType}", delete=False
+                )
+                self.__config["spool_temps"].append(Path(handle.name))
+            else:
+                handle = open(file, "wb")
+            handles[handleType] = handle
+            self.__config[handleType] = Path(handle.name)
+        return handles
+
+    def cleanup(self) -> None:
+        """
+        Remove temporary spool files.
+        """
+        for path in self.__config["spool_temps"]:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self.__config["spool_temps"].clear()
+
     def join(self) -> None:
         proc = self.process
-        if self.started and proc is not None and self.returncode is None:
+        if not (self.started and proc is not None and self.returncode is None):
+            return
+        if self.spool:
+            try:
+                self.join_before()
+                proc.wait()
+                self.join_after()
+            except Exception:
+                proc.kill()
+                raise ChildProcessError("some error happened.")
+            finally:
+                self.__config["returncode"] = proc.poll()
+                if self.__config["tail"] > 0:
+                    for handleType in ("stdout", "stderr"):
+                        self.__config[f"{handleType}_tail"] = _readTail(
+                            self.__config[handleType], self.__config["tail"]
+                        )
+        else:
             with proc:
+                stdout = stderr = b""
                 try:
                     self.join_before()
                     stdout, stderr = proc.communicate()
@@ -376,3 +1241,71 @@ class Disposable(ABC):
         else:
             returncode = 1
         return CompletedProcess(proc.args, returncode, self.stdout, self.stderr)
+
+
+def _readTail(
+    path: Union[str, Path], count: int, chunk_size: int = 1 << 16
+) -> List[str]:
+    """
+    Read the last `count` lines of a file, reading backwards in chunks.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        data = b""
+        while pos > 0 and data.count(b"\n", 0, max(len(data) - 1, 0)) < count:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode(errors="replace").splitlines(keepends=True)
+    return lines[-count:]
+
+
+def runDisposables(
+    jobs: Iterable[Disposable],
+    max_workers: Optional[int] = None,
+    return_exceptions: bool = False,
+) -> Iterator[Tuple[Disposable, Union[CompletedProcess, BaseException]]]:
+    """
+    Run many `Disposable` concurrently, yield `(job, result)` in completion order.
+
+    Every job goes through its own `run()`, so the callback order of each job is
+    unchanged. At most `max_workers` (default: CPU count) jobs run at the same
+    time, and jobs are pulled from `jobs` only when a slot is free.
+
+    Parameters
+    ---
+        jobs : Disposable instances to run.
+        max_workers : Maximum number of processes running at the same time.
+        return_exceptions : Yield exceptions raised by a job as its result instead
+            of raising them.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers < 1:
+        raise ValueError(f"max_workers should be a positive integer - {max_workers}")
+    jobs = iter(jobs)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                for job in jobs:
+                    running[executor.submit(job.run)] = job
+                    if len(running) >= max_workers:
+                        break
+                if not running:
+                    return
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        yield job, future.result()
+                    elif return_exceptions:
+                        yield job, error
+                    else:
+                        raise error
+        finally:
+            for future in running:
+                future.cancel()
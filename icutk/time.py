@@ -1,11 +1,24 @@
 from __future__ import annotations
 from time import perf_counter
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
+from array import array
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from threading import Lock, get_ident
+import gc
+import inspect
+import json
+import os
+import statistics
 
 from .log import getLogger
 
 __all__ = [
     "MeasureTime",
+    "BenchmarkResult",
+    "Profiler",
+    "getProfiler",
 ]
 
 
@@ -36,7 +49,9 @@ class MeasureTime:
             error = e
         end_time = perf_counter()
         self.info(
-            f"Procedure {self.func.__name__!r} took {end_time - start_time} seconds to run"
+            "Procedure %r took %s seconds to run",
+            self.func.__name__,
+            end_time - start_time,
         )
         if error:
             raise error
@@ -48,7 +63,7 @@ class MeasureTime:
 
     def __exit__(self, *args, **kwargs) -> None:
         self.done()
-        self.info(f"Program took {self.used} seconds to run")
+        self.info("Program took %s seconds to run", self.used)
 
     @property
     def used(self) -> float:
@@ -65,3 +80,338 @@ class MeasureTime:
         self.end = perf_counter()
         self._used = self.end - self.start
         return self.used
+
+    def benchmark(
+        self,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        *,
+        warmup: int = 3,
+        repeat: Optional[int] = None,
+        number: Optional[int] = None,
+        duration: float = 1.0,
+        disable_gc: bool = True,
+        name: Optional[str] = None,
+    ) -> BenchmarkResult:
+        """
+        Run the function repeatedly and collect timing statistics.
+
+        Parameters
+        ---
+            args : Positional arguments of the function.
+            kwargs : Keyword arguments of the function.
+            warmup : Calls made before measuring.
+            repeat : Number of samples, by default as many as fit in `duration`
+                seconds (at least 5).
+            number : Calls per sample, by default calibrated so a sample takes at
+                least 10 ms.
+            duration : Time budget in seconds used when `repeat` is not given.
+            disable_gc : Collect garbage before and disable GC while sampling.
+            name : Name of the result, defaults to the function name.
+        """
+        if self.func is None:
+            raise ValueError("No function provided")
+        func = self.func
+        kwargs = {} if kwargs is None else kwargs
+
+        def sample(loops: int) -> float:
+            start = perf_counter()
+            for _ in range(loops):
+                func(*args, **kwargs)
+            return perf_counter() - start
+
+        for _ in range(warmup):
+            func(*args, **kwargs)
+        gc_enabled = gc.isenabled()
+        if disable_gc:
+            gc.collect()
+            gc.disable()
+        try:
+            if number is None:
+                number = 1
+                while True:
+                    used = sample(number)
+                    if used >= 0.01:
+                        break
+                    number *= 10 if used < 0.001 else 2
+            if repeat is None:
+                repeat = max(int(duration / max(sample(number), 1e-9)), 5)
+            samples = [sample(number) / number for _ in range(repeat)]
+        finally:
+            if disable_gc and gc_enabled:
+                gc.enable()
+        result = BenchmarkResult(name or func.__qualname__, samples, number)
+        self.info("%s", result)
+        return result
+
+
+class BenchmarkResult:
+    """
+    Timing statistics of `MeasureTime.benchmark`, in seconds per call.
+    """
+
+    def __init__(self, name: str, samples: List[float], number: int = 1) -> None:
+        if not samples:
+            raise ValueError("samples is empty")
+        self.name = name
+        self.samples = sorted(samples)
+        self.number = number
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}({self.name!r}, "
+            f"median={self.median:.3e}, stdev={self.stdev:.3e}, "
+            f"n={len(self.samples)}x{self.number})"
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"Benchmark {self.name!r}: mean {self.mean:.3e} ± {self.stdev:.3e}, "
+            f"median {self.median:.3e}, p95 {self.p95:.3e}, p99 {self.p99:.3e} "
+            f"seconds ({len(self.samples)} x {self.number} runs)"
+        )
+
+    def percentile(self, p: float) -> float:
+        samples = self.samples
+        return samples[max(int(-(-len(samples) * p // 100)) - 1, 0)]
+
+    @property
+    def mean(self) -> float:
+        return sum(self.samples) / len(self.samples)
+
+    @property
+    def stdev(self) -> float:
+        if len(self.samples) < 2:
+            return 0.0
+        return statistics.stdev(self.samples)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.samples)
+
+    @property
+    def p95(self) -> float:
+        return self.percentile(95)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "mean": self.mean,
+            "stdev": self.stdev,
+            "median": self.median,
+            "p95": self.p95,
+            "p99": self.p99,
+            "samples": len(self.samples),
+            "number": self.number,
+        }
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Store the result in a baseline file under its name, other entries are kept.
+        """
+        path = Path(path)
+        data = json.loads(path.read_text("utf-8")) if path.exists() else {}
+        data[self.name] = self.to_dict()
+        path.write_text(json.dumps(data, indent=2), "utf-8")
+
+    def compare(
+        self,
+        baseline: Union[str, Path, BenchmarkResult],
+        threshold: float = 0.1,
+        key: str = "median",
+    ) -> bool:
+        """
+        Compare `key` with the baseline, return True if it regressed by more than
+        `threshold` (relative).
+        """
+        if isinstance(baseline, BenchmarkResult):
+            reference = baseline.to_dict()[key]
+        else:
+            data = json.loads(Path(baseline).read_text("utf-8"))
+            if self.name not in data:
+                raise KeyError(f"no baseline for {self.name!r} in {str(baseline)!r}")
+            reference = data[self.name][key]
+        return self.to_dict()[key] > reference * (1 + threshold)
+
+
+class _NullSpan:
+    """
+    Span of a disabled profiler, still wraps functions so they are recorded
+    once the profiler is enabled.
+    """
+
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler: Profiler, name: Optional[str]) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        pass
+
+    def __call__(self, func: Callable) -> Callable:
+        return _Span(self.profiler, self.name)(func)
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start", "token")
+
+    def __init__(self, profiler: Profiler, name: Optional[str]) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> _Span:
+        parent = self.profiler._current.get()
+        path = self.name if parent is None else f"{parent}/{self.name}"
+        self.token = self.profiler._current.set(path)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        end = perf_counter()
+        path = self.profiler._current.get()
+        self.profiler._current.reset(self.token)
+        self.profiler._record(path, self.start, end)
+
+    def __call__(self, func: Callable) -> Callable:
+        profiler = self.profiler
+        name = self.name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                if not profiler.enabled:
+                    return await func(*args, **kwargs)
+                with _Span(profiler, name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with _Span(profiler, name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class Profiler:
+    """
+    Nested named spans aggregated in memory.
+
+    Spans opened inside another span (in the same thread or asyncio task) are
+    recorded under the path `parent/child`.
+
+    >>> profiler = Profiler()
+    >>> with profiler.span("parse"):
+    >>>     with profiler.span("lex"):
+    >>>         ...
+    >>> profiler.stats()["parse/lex"]["count"]
+
+    Parameters
+    ---
+        enabled : Record spans, a disabled profiler returns no-op spans.
+        trace : Also keep every span as an event for `dump_chrome_trace`.
+    """
+
+    percentiles = (50, 90, 99)
+
+    def __init__(self, enabled: bool = True, trace: bool = False) -> None:
+        self.enabled = enabled
+        self.trace = trace
+        self._current: ContextVar[Optional[str]] = ContextVar(
+            f"icutk_profiler_{id(self)}", default=None
+        )
+        self.__lock = Lock()
+        self.__samples: Dict[str, array] = {}
+        self.__events: List[tuple] = []
+
+    def span(self, name: Optional[str] = None) -> Union[_Span, _NullSpan]:
+        """
+        Span as a context manager or a decorator, a decorator defaults `name` to
+        the qualified name of the function.
+        """
+        if not self.enabled:
+            return _NullSpan(self, name)
+        return _Span(self, name)
+
+    def _record(self, path: str, start: float, end: float) -> None:
+        with self.__lock:
+            samples = self.__samples.get(path)
+            if samples is None:
+                samples = self.__samples[path] = array("d")
+            samples.append(end - start)
+            if self.trace:
+                self.__events.append((path, start, end, get_ident()))
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__samples.clear()
+            self.__events.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        count, total, min, max, mean and percentiles (seconds) of every span path.
+        """
+        with self.__lock:
+            items = [
+                (path, sorted(samples)) for path, samples in self.__samples.items()
+            ]
+        result = {}
+        for path, samples in items:
+            count = len(samples)
+            total = sum(samples)
+            stat = {
+                "count": count,
+                "total": total,
+                "min": samples[0],
+                "max": samples[-1],
+                "mean": total / count,
+            }
+            for p in self.percentiles:
+                rank = max(int(-(-count * p // 100)) - 1, 0)
+                stat[f"p{p}"] = samples[rank]
+            result[path] = stat
+        return result
+
+    def dump_json(self, path: Union[str, Path]) -> None:
+        Path(path).write_text(json.dumps(self.stats(), indent=2), "utf-8")
+
+    def dump_chrome_trace(self, path: Union[str, Path]) -> None:
+        """
+        Write the events in Chrome trace-event format, requires `trace=True`.
+        """
+        pid = os.getpid()
+        with self.__lock:
+            events = [
+                {
+                    "name": name.rpartition("/")[2],
+                    "cat": name,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                }
+                for name, start, end, tid in self.__events
+            ]
+        Path(path).write_text(json.dumps({"traceEvents": events}), "utf-8")
+
+
+_profiler = Profiler(enabled=False)
+
+
+def getProfiler() -> Profiler:
+    """
+    Shared profiler, disabled until `enabled` is set.
+    """
+    return _profiler
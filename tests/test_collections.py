@@ -0,0 +1,126 @@
+import copy
+import pickle
+
+import pytest
+
+from icutk.collections import Parameter, ParameterTable
+
+DEVICES = [
+    Parameter(name="XNM1", model="nmos", m=1, width=1e-6),
+    Parameter(name="XNM2", model="nmos", m=1, width=2e-6),
+    Parameter(name="XPM1", model="pmos", m=2, width=2e-6),
+    {"name": "R0", "model": "res"},
+]
+
+
+class TestParameter:
+    def test_init(self):
+        param = Parameter({"model": "nmos"}, m=1)
+        assert param.keys() == ("model", "m")
+        assert param.values() == ("nmos", 1)
+        assert param.width is None
+        with pytest.raises(ValueError):
+            Parameter({"a-b": 1})
+
+    def test_fast(self):
+        keys = ("name", "m")
+        first = Parameter.from_values(keys, ["XNM1", 1])
+        second = Parameter.from_values(keys, ["XNM2", 2])
+        assert second("name", "m") == ("XNM2", 2)
+        # 相同的 key 只保存一份
+        assert first.keys()[0] is second.keys()[0]
+        with pytest.raises(ValueError):
+            Parameter.from_values(("a-b",), [1])
+
+        trusted = Parameter.from_trusted({"name": "XNM3"})
+        assert trusted.name == "XNM3"
+
+    def test_copy(self):
+        param = Parameter(name="XNM1", nets=["A", "B"])
+        for other in (
+            copy.copy(param),
+            copy.deepcopy(param),
+            pickle.loads(pickle.dumps(param)),
+        ):
+            assert isinstance(other, Parameter)
+            assert tuple(other) == tuple(param)
+        assert copy.copy(param).nets is param.nets
+        assert copy.deepcopy(param).nets is not param.nets
+
+
+class TestParameterTable:
+    def test_rows(self):
+        table = ParameterTable.from_records(DEVICES)
+        assert len(table) == 4
+        assert table.keys() == ("name", "model", "m", "width")
+
+        row = table[1]
+        assert row["width"] == 2e-6
+        assert row.model == "nmos"
+        assert row.unknown is None
+        assert row.get("unknown", 0) == 0
+        assert row("name", "m") == ("XNM2", 1)
+        assert row == DEVICES[1]
+        assert table[-1].width is None
+        assert row.to_parameter().name == "XNM2"
+
+        with pytest.raises(IndexError):
+            table[4]
+
+    def test_append(self):
+        table = ParameterTable(["name", "m"])
+        table.append(name="XNM1", m=1)
+        table.extend([{"name": "XNM2"}])
+        assert table.column("m") == [1, None]
+        with pytest.raises(KeyError):
+            table.append(width=1)
+        with pytest.raises(ValueError):
+            ParameterTable(["a-b"])
+
+    def test_query(self):
+        table = ParameterTable.from_records(DEVICES)
+        wide_nmos = table.filter(model="nmos", width=lambda w: w > 1e-6)
+        assert [row.name for row in wide_nmos] == ["XNM2"]
+
+        assert table.where(m=1) == [0, 1]
+        assert table.select("name", "m").keys() == ("name", "m")
+
+        groups = table.group("model")
+        assert list(groups) == ["nmos", "pmos", "res"]
+        assert len(groups["nmos"]) == 2
+
+    def test_numpy(self):
+        pytest.importorskip("numpy")
+        table = ParameterTable.from_records(DEVICES[:3])
+        width = table.column("width", numpy=True)
+        assert [row.name for row in table.filter(width > 1e-6, model="pmos")] == [
+            "XPM1"
+        ]
+
+    def test_typed_columns(self):
+        table = ParameterTable.from_records(DEVICES)
+        # 纯数值列用 array 存储, 含 None 的列仍是 list
+        assert table.column("m") == [1, 1, 2, None]
+        assert (
+            table.select("m").filter(m=lambda m: m is not None).column("m").typecode
+            == "q"
+        )
+        assert table.take([0, 1]).column("width").typecode == "d"
+
+        table = ParameterTable(["name", "m"])
+        table.extend([{"name": "XNM1", "m": 1}, {"name": "XNM2", "m": 2}])
+        table.pack()
+        assert table.column("m").typecode == "q"
+        table.append(name="XNM3", m=None)
+        assert table.column("m") == [1, 2, None]
+
+    def test_numpy_where(self):
+        pytest.importorskip("numpy")
+        table = ParameterTable.from_records(
+            DEVICES + [{"name": 1, "model": "nmos", "width": 1e-6}]
+        )
+        assert table.column("name", numpy=True) is table.column("name", numpy=True)
+        assert table.where(name=1) == [4]
+        assert table.where(model="nmos", width=lambda w: w > 1e-6) == [1]
+        table.append(name="XNM4", model="nmos", width=3e-6)
+        assert table.where(model="nmos", width=lambda w: w > 1e-6) == [1, 5]
@@ -1,5 +1,7 @@
-from icutk.lex import BaseLexer
+import pickle
+from pathlib import Path
 
+from icutk.lex import BaseLexer, SubcktIndex, TokenCache, tokenizeParallel
 
 code = """\
 1 - .SUBCKT NAND2 A B VDD VSS Y
@@ -13,6 +15,36 @@ code = """\
 
 lexer = BaseLexer()
 lexer.input(code)
+
+
+class NewlineLexer(BaseLexer):
+    # 换行作为语句结束输出
+    tokens = BaseLexer.tokens + ["NEWLINE"]
+
+    def t_newline(self, t):
+        r"\n+"
+        self.line_count(t.value)
+        t.type = "NEWLINE"
+        return t
+
+
+class DotLexer(BaseLexer):
+    # ".SUBCKT" 是一个 token
+    tokens = BaseLexer.tokens + ["DOTCMD"]
+
+    t_DOTCMD = r"\.[a-zA-Z]+"
+
+
+class EofLexer(BaseLexer):
+    # t_eof 必须绑定到各自的实例
+    def __init__(self, *args, **kwargs):
+        self.seen = []
+        super().__init__(*args, **kwargs)
+
+    def t_eof(self, t):
+        self.seen.append(t.type)
+
+
 tokens = list(lexer)
 
 
@@ -35,3 +67,158 @@ class TestBaseLexer:
 
         assert tokens[3].type == "ID"
         assert tokens[3].value == "SUBCKT"
+
+    def test_cached_tables(self):
+        # 词法表只构建一次, 每个实例拿到独立的 clone
+        other = BaseLexer("1 - A\nB")
+        assert other.lexer is not lexer.lexer
+        assert other.lexer.lexre[0][0] is lexer.lexer.lexre[0][0]
+        assert [t.value for t in other] == [1, "-", "A", "B"]
+        assert other.lexer.lineno == 2
+        assert not hasattr(tokens[0], "__dict__")
+
+    def test_eof(self):
+        first = EofLexer("1 - A")
+        second = EofLexer("B")
+        assert [t.value for t in first] == [1, "-", "A"]
+        assert [t.value for t in second] == ["B"]
+        assert first.seen == ["eof"]
+        assert second.seen == ["eof"]
+
+
+class TestTokenizeFile:
+    def test_chunks(self, tmp_path):
+        path = tmp_path / "a.sp"
+        path.write_text(
+            "* comment\n.SUBCKT INV A Y\n+ VDD VSS\nXM1 Y A VSS nmos\n.ENDS\n"
+        )
+        # chunk 很小, token 会跨越 chunk 边界
+        toks = list(BaseLexer().tokenize_file(path, chunk_size=4))
+        assert [t.value for t in toks[:6]] == [".", "SUBCKT", "INV", "A", "Y", "VDD"]
+        assert "+" not in {t.type for t in toks}
+        assert "comment" not in {t.value for t in toks}
+        assert toks[0].lineno == 2
+        assert toks[5].lineno == 3
+        assert toks[-1].lineno == 5
+        assert toks[0].filename == str(path)
+
+        raw = list(BaseLexer().tokenize_file(path, spice=False))
+        assert [t.value for t in raw[:2]] == ["*", "comment"]
+
+    def test_continuation(self, tmp_path):
+        path = tmp_path / "e.sp"
+        path.write_text("XM1 A B\n+ C D\n* comment\n\n  + E\nXM2 F\n")
+        for chunk_size in (3, 1 << 20):
+            toks = list(NewlineLexer().tokenize_file(path, chunk_size=chunk_size))
+            # 续行合并到同一条语句, 行号仍是原始行号
+            assert [(t.value, t.lineno) for t in toks if t.type != "NEWLINE"] == [
+                ("XM1", 1),
+                ("A", 1),
+                ("B", 1),
+                ("C", 2),
+                ("D", 2),
+                ("E", 5),
+                ("XM2", 6),
+                ("F", 6),
+            ]
+            assert [t.type for t in toks].count("NEWLINE") == 2
+
+
+class TestTokenizeParallel:
+    def test_order(self, tmp_path):
+        path = tmp_path / "b.sp"
+        cells = "".join(
+            f".SUBCKT C{i} A Y\n+ VDD VSS\nXM1 Y A VSS nmos w=1u\n.ends\n\n"
+            for i in range(50)
+        )
+        path.write_text("* top\n" + cells + "X1 A Y C0\n")
+        blocks = list(tokenizeParallel(path, max_workers=2, chunk_size=64))
+        assert [b.name for b in blocks if b.name] == [f"C{i}" for i in range(50)]
+        # 与单进程流式结果完全一致 (含行号)
+        expected = [
+            (t.type, t.value, t.lineno) for t in BaseLexer().tokenize_file(path)
+        ]
+        assert [(t.type, t.value, t.lineno) for b in blocks for t in b] == expected
+        assert pickle.loads(pickle.dumps(blocks[1])).values == blocks[1].values
+
+    def test_lexer_class(self, tmp_path):
+        path = tmp_path / "b.sp"
+        path.write_text(".SUBCKT INV A Y\n.ENDS\nX1 A Y INV\n.subckt BUF A Y\n.ends\n")
+        blocks = list(tokenizeParallel(path, lexer_class=DotLexer, max_workers=1))
+        # 子电路名来自扫描结果, 与 token 的形式无关
+        assert [b.name for b in blocks] == ["INV", None, "BUF"]
+        assert next(iter(blocks[0])).type == "DOTCMD"
+
+
+class TestSubcktIndex:
+    def test_index(self, tmp_path):
+        path = tmp_path / "c.sp"
+        path.write_text(
+            ".SUBCKT INV A Y\n+ VDD VSS W=1\nXM1 Y A VSS nmos\n.ENDS\n"
+            ".subckt BUF A Y VDD VSS\nX1 A n INV\n.ends BUF\n"
+        )
+        index = SubcktIndex(path)
+        assert list(index) == ["INV", "BUF"]
+        assert index.pins("INV") == ["A", "Y", "VDD", "VSS"]
+        assert Path(f"{path}.subckt.json").exists()
+
+        lines = SubcktIndex(path).lines("BUF", chomp=True)
+        assert lines.next == ".subckt BUF A Y VDD VSS"
+        assert lines.total_lines == 3
+
+        # 网表修改后自动重建
+        path.write_text(".SUBCKT NAND2 A B Y\n.ENDS\n")
+        assert list(SubcktIndex(path)) == ["NAND2"]
+
+    def test_pins(self, tmp_path):
+        path = tmp_path / "c.sp"
+        path.write_text(
+            ".SUBCKT INV A Y PARAMS: W=1u L='2*x + 1'\n.ENDS\n"
+            ".SUBCKT BUF A Y $ comment\n+ VDD net$1\n.ENDS\n"
+            ".SUBCKT R2 A B w = 1\n.ENDS\n"
+        )
+        index = SubcktIndex(path)
+        assert index.pins("INV") == ["A", "Y"]
+        assert index.pins("BUF") == ["A", "Y", "VDD", "net$1"]
+        assert index.pins("R2") == ["A", "B"]
+
+
+class TestTokenCache:
+    def test_cache(self, tmp_path, monkeypatch):
+        path = tmp_path / "d.sp"
+        path.write_text(code)
+        cache = TokenCache(tmp_path / "cache")
+        assert cache.load(path) is None
+        first = cache.tokenize(path)
+        assert [(t.type, t.value) for t in first] == [(t.type, t.value) for t in tokens]
+
+        # 第二次命中缓存, 不再调用词法分析
+        monkeypatch.setattr(BaseLexer, "tokenize_file", None)
+        second = TokenCache(tmp_path / "cache").tokenize(path)
+        assert [(t.type, t.value, t.lineno) for t in second] == [
+            (t.type, t.value, t.lineno) for t in first
+        ]
+
+        # 超出大小上限时淘汰最久未使用的条目
+        small = TokenCache(tmp_path / "cache", max_size=0, fast=True)
+        small.evict()
+        assert small.load(path) is None
+        assert not list((tmp_path / "cache").iterdir())
+
+    def test_invalid_entry(self, tmp_path):
+        path = tmp_path / "d.sp"
+        path.write_text("R1 A B 1.5\n")
+        cache = TokenCache(tmp_path / "cache", fast=True)
+        entry = tmp_path / "cache" / f"{cache.key(path)}{TokenCache.SUFFIX}"
+        # 编码不同, 解码出的 token 也可能不同
+        other = TokenCache(tmp_path / "cache", fast=True, encoding="latin-1")
+        assert other.key(path) != cache.key(path)
+        # 损坏的条目当作未命中并删除
+        for data in (pickle.dumps([1, 2]), b"ICUTKTOK\xff\xff", b""):
+            entry.write_bytes(data)
+            assert cache.load(path) is None
+            assert not entry.exists()
+
+        block = cache.tokenize(path)
+        assert entry.exists()
+        assert cache.load(path).values == block.values == ["R1", "A", "B", 1.5]
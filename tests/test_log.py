@@ -0,0 +1,108 @@
+import logging
+import threading
+
+from icutk.log import disableQueueLogging, enableQueueLogging, getLogger
+
+
+class Collector(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append((self.format(record), threading.current_thread()))
+
+
+class TestQueueLogging:
+    def test_queue(self):
+        getLogger()
+        root = logging.getLogger()
+        collector = Collector()
+        root.addHandler(collector)
+        try:
+            logger = getLogger("icutk.test", queue=True)
+            assert collector not in root.handlers
+            logger.warning("value %d", 42)
+            disableQueueLogging()
+            assert collector in root.handlers
+            # 在后台线程中格式化
+            assert collector.records[-1][0] == "value 42"
+            assert collector.records[-1][1] is not threading.current_thread()
+        finally:
+            disableQueueLogging()
+            root.removeHandler(collector)
+
+    def test_idempotent(self):
+        enableQueueLogging()
+        enableQueueLogging()
+        try:
+            queued = [h for h in logging.getLogger().handlers if hasattr(h, "queue")]
+            assert len(queued) == 1
+        finally:
+            disableQueueLogging()
+
+
+class TestMutToneLogger:
+    def setup_method(self):
+        self.logger = getLogger("icutk.test.mute")
+        self.logger.logger.setLevel(logging.INFO)
+        self.collector = Collector()
+        self.logger.logger.addHandler(self.collector)
+
+    def teardown_method(self):
+        self.logger.logger.removeHandler(self.collector)
+
+    def messages(self):
+        return [message for message, _ in self.collector.records]
+
+    def test_lazy(self):
+        calls = []
+
+        def message():
+            calls.append(1)
+            return "lazy"
+
+        self.logger.debug(message)
+        assert calls == []
+        self.logger.info(message)
+        assert calls == [1]
+
+        self.logger.mute = True
+        assert self.logger.info == self.logger.mute_all
+        self.logger.info(message)
+        assert calls == [1]
+        assert self.messages() == ["lazy"]
+
+        self.logger.mute = False
+        self.logger.info("%s-%d", "a", 1)
+        assert self.messages() == ["lazy", "a-1"]
+
+    def test_once(self):
+        for i in range(3):
+            self.logger.log_once(logging.INFO, "once %d", i)
+        assert self.messages() == ["once 0"]
+
+    def test_every(self):
+        for _ in range(5):
+            self.logger.log_every(60, logging.INFO, "hot loop")
+        assert self.messages() == ["hot loop"]
+        self.logger.log_every(0, logging.INFO, "hot loop")
+        assert self.messages() == [
+            "hot loop",
+            "hot loop (4 similar messages suppressed)",
+        ]
+
+    def test_callable_key(self):
+        # 循环里的 lambda 每次都是新对象, 按代码对象归为同一个 key
+        for i in range(1000):
+            self.logger.log_every(60, logging.INFO, lambda: f"x {i}")
+            self.logger.log_once(logging.INFO, lambda: f"y {i}")
+        assert self.messages() == ["x 0", "y 0"]
+
+    def test_max_keys(self, monkeypatch):
+        monkeypatch.setattr(self.logger, "max_keys", 2)
+        for i in range(5):
+            self.logger.log_once(logging.INFO, "key %d", i, key=i)
+        self.logger.log_once(logging.INFO, "key %d", 0, key=0)
+        assert self.messages()[-1] == "key 0"
+        assert len(self.messages()) == 6
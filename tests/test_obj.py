@@ -0,0 +1,66 @@
+import gc
+
+import pytest
+
+from icutk.obj import AutoRegister, SubClassRegistry, getSubClassDict
+
+
+class Device(AutoRegister):
+    pass
+
+
+class Mos(Device):
+    pass
+
+
+class Nmos(Mos):
+    pass
+
+
+class Res(Device, name="R"):
+    pass
+
+
+class TestGetSubClassDict:
+    def test_subclasses(self):
+        assert getSubClassDict(Mos) == {"Nmos": Nmos}
+        # 不同调用之间的结果互不影响
+        assert getSubClassDict(Device) == {"Mos": Mos, "Nmos": Nmos, "Res": Res}
+
+
+class TestAutoRegister:
+    def test_lookup(self):
+        assert Device.registry["Mos"] is Mos
+        assert Device.registry["Nmos"] is Nmos
+        assert Device.registry["R"] is Res
+        assert "Device" not in Device.registry
+        assert Device.registry.of(Mos) == {"Nmos": Nmos}
+
+    def test_dynamic(self):
+        Cap = type("Cap", (Device,), {})
+        assert Device.registry["Cap"] is Cap
+        del Cap
+        gc.collect()
+        assert "Cap" not in Device.registry
+
+    def test_conflict(self):
+        with pytest.raises(ValueError):
+            type("Mos", (Device,), {"__module__": "other"})
+
+        # 重新定义同一个类会替换旧的
+        redefined = type("Mos", (Device,), {"__module__": __name__})
+        assert Device.registry["Mos"] is redefined
+        Device.registry.register(Mos)
+
+
+class TestSubClassRegistry:
+    def test_qualified(self):
+        registry = SubClassRegistry(qualified=True)
+
+        @registry.register
+        class Inner:
+            pass
+
+        key = f"{__name__}.TestSubClassRegistry.test_qualified.<locals>.Inner"
+        assert registry[key] is Inner
+        assert list(registry) == [key]
@@ -0,0 +1,57 @@
+import os
+
+from icutk.path import PathResolver, realpath
+
+
+class TestPathResolver:
+    def test_resolve(self, tmp_path):
+        (tmp_path / "lib").mkdir()
+        (tmp_path / "link").symlink_to(tmp_path / "lib")
+        resolver = PathResolver()
+        for path in ["link/a.sp", "lib/../link/b.sp", "lib/./c.sp", "missing/d.sp"]:
+            assert resolver.resolve(tmp_path / path) == realpath(tmp_path / path)
+
+        paths = [tmp_path / "link" / f"{i}.sp" for i in range(20)]
+        assert resolver.resolve_many(paths) == [realpath(p) for p in paths]
+
+    def test_invalidate(self, tmp_path):
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        resolver = PathResolver()
+        assert (
+            resolver.resolve(tmp_path / "link" / "x")
+            == tmp_path.resolve() / "link" / "x"
+        )
+
+        # 缓存的结果在 invalidate 之前不会变化
+        (tmp_path / "link").symlink_to(tmp_path / "a")
+        assert (
+            resolver.resolve(tmp_path / "link" / "x")
+            == tmp_path.resolve() / "link" / "x"
+        )
+        resolver.invalidate(tmp_path / "link")
+        assert (
+            resolver.resolve(tmp_path / "link" / "x") == tmp_path.resolve() / "a" / "x"
+        )
+
+        # ttl 为 0 时每次都重新解析
+        resolver = PathResolver(ttl=0)
+        assert (
+            resolver.resolve(tmp_path / "link" / "x") == tmp_path.resolve() / "a" / "x"
+        )
+        (tmp_path / "link").unlink()
+        (tmp_path / "link").symlink_to(tmp_path / "b")
+        assert (
+            resolver.resolve(tmp_path / "link" / "x") == tmp_path.resolve() / "b" / "x"
+        )
+
+    def test_expand(self, monkeypatch):
+        monkeypatch.setenv("ICUTK_TEST_DIR", "/opt/lib")
+        resolver = PathResolver()
+        assert resolver.expand("$ICUTK_TEST_DIR/a.sp") == resolver.expand(
+            "${ICUTK_TEST_DIR}/a.sp"
+        )
+        assert str(resolver.expand("$ICUTK_TEST_DIR/a.sp")) == "/opt/lib/a.sp"
+        assert resolver.resolve("~/x", expand=True) == realpath(
+            os.path.expanduser("~/x")
+        )
@@ -1,6 +1,17 @@
 import re
 
-from icutk.string import LineIterator
+import pytest
+
+import icutk.string
+
+from icutk.string import (
+    LineIndex,
+    LineIterator,
+    PrefixMatcher,
+    evalSpiceValue,
+    evalSpiceValues,
+    startswith,
+)
 
 
 STRINGS = """\
@@ -100,3 +111,158 @@ class TestLineIterator:
         assert di.next == "5 - XPM1 Y B VDD VDD VSS pmos m=1 length=600n width=2u"
         assert di.next == "6 - XPM2 Y A VDD VDD VSS pmos m=1 length=600n width=2u"
         assert di.next == "7 - .ENDS"
+
+    def test_stream(self):
+        di = LineIterator(iter(STRINGS), chomp=True, stream=True, window=2)
+        assert di.total_lines is None
+
+        for _ in range(3):
+            di.next
+
+        # 只保留最近 2 行
+        assert list(di.last) == [
+            "2 - *.PININFO A:I B:I Y:O VDD:B VSS:B",
+            "3 - XNM1 Y A net0 VSS nmos m=1 length=600n width=1u",
+        ]
+
+        # 偷看不影响历史
+        assert di.peek_next == "4 - XNM2 net0 B VSS VSS nmos m=1 length=600n width=1u"
+        assert len(di.last) == 2
+
+        di.revert(2)
+        assert di.line == 1
+        assert di.next == "2 - *.PININFO A:I B:I Y:O VDD:B VSS:B"
+
+        # 超出窗口不能回退
+        with pytest.raises(ValueError):
+            di.revert(3)
+
+        # 读完后得到总行数
+        assert len(list(di)) == 5
+        assert di.total_lines == len(STRINGS)
+
+    def test_from_file(self, tmp_path):
+        path = tmp_path / "nand2.sp"
+        path.write_text("".join(STRINGS))
+
+        with LineIndex(path) as index:
+            assert len(index) == len(STRINGS)
+            assert index[-1] == STRINGS[-1]
+
+            di = LineIterator.from_file(index, chomp=True)
+            assert di.total_lines == len(STRINGS)
+            for s in STRINGS[:3]:
+                assert di.next == re.sub(r"\n$", "", s)
+            assert list(di.last) == [re.sub(r"\n$", "", s) for s in STRINGS[:3]]
+
+            di.revert(2)
+            assert di.last1 == "1 - .SUBCKT NAND2 A B VDD VSS Y"
+            assert di.peek_next == "2 - *.PININFO A:I B:I Y:O VDD:B VSS:B"
+
+            # 直接跳到第 6 行
+            di.seek(5)
+            assert di.last1 == "5 - XPM1 Y B VDD VDD VSS pmos m=1 length=600n width=2u"
+            assert list(di) == [
+                "6 - XPM2 Y A VDD VDD VSS pmos m=1 length=600n width=2u",
+                "7 - .ENDS",
+            ]
+
+            # 共用同一个索引
+            other = LineIterator.from_file(index)
+            assert other.index is index
+            assert other.next == STRINGS[0]
+
+            with pytest.raises(ValueError):
+                di.seek(len(STRINGS) + 1)
+
+    def test_index_window(self, tmp_path, monkeypatch):
+        # 窗口小于文件, 换行符落在窗口边界上也能正确建索引
+        monkeypatch.setattr(icutk.string, "_INDEX_WINDOW", 7)
+        path = tmp_path / "nand2.sp"
+        path.write_text("".join(STRINGS))
+        with LineIndex(path) as index:
+            assert list(index) == STRINGS
+
+    def test_from_file_no_trailing_newline(self, tmp_path):
+        path = tmp_path / "lines.txt"
+        path.write_text("a\nb")
+        assert list(LineIterator.from_file(path)) == ["a\n", "b"]
+
+        path.write_text("")
+        assert list(LineIterator.from_file(path)) == []
+
+
+class TestStartswith:
+    def test_literal(self):
+        assert startswith("  .SUBCKT NAND2", [".ENDS", ".SUBCKT"])
+        assert not startswith(".subckt NAND2", [".ENDS", ".SUBCKT"])
+        assert not startswith("", [])
+
+        matcher = PrefixMatcher([".SUBCKT", ".SUB", "*"])
+        assert startswith(".SUBCKT NAND2", matcher)
+        assert matcher.which(".SUBCKT NAND2") == ".SUB"
+        assert matcher.which("XNM1 Y A net0 VSS nmos") is None
+        # 只跳过开头的空白, 结尾的空白也要参与匹配
+        assert startswith("  .END ", [".END "])
+
+    def test_regex(self):
+        obj = startswith("XNM1 Y A", [r"M\w+", r"x(\w+)"], regex=True, case=True)
+        assert obj.group(0) == "XNM1"
+
+        matcher = PrefixMatcher([r"\.ends", r"x(\w+)"], regex=True, case=True)
+        assert startswith("XNM1 Y A", matcher).group(0) == "XNM1"
+        assert matcher.which("XNM1 Y A") == r"x(\w+)"
+        assert matcher.match("MNM1 Y A") is False
+
+    def test_regex_fallback(self):
+        # 重名分组无法合并成一个正则
+        matcher = PrefixMatcher([r"(?P<n>a)", r"(?P<n>b)"], regex=True)
+        assert matcher.match("b").group("n") == "b"
+        assert matcher.which("a") == r"(?P<n>a)"
+
+    def test_regex_groups(self):
+        # 返回模式自己的匹配结果, 分组编号不受合并影响
+        assert startswith("XNM1", [r"x(\w+)"], regex=True, case=True).group(1) == "NM1"
+        obj = startswith("XNM1", [r"\.ends", r"x(\w+)"], regex=True, case=True)
+        assert obj.group(1) == "NM1"
+        assert startswith("bb", ["(a)", r"(b)\1"], regex=True).group(0) == "bb"
+
+        matcher = PrefixMatcher([r"\.ends", r"x\w+"], regex=True, case=True)
+        assert matcher.match("XNM1 Y").re.pattern == r"x\w+"
+
+
+class TestEvalSpiceValue:
+    def test_basic(self):
+        assert evalSpiceValue("123") == 123
+        assert evalSpiceValue("-5") == -5
+        assert evalSpiceValue(".23") == 0.23
+        assert evalSpiceValue("1.") == 1.0
+        assert evalSpiceValue("1e-3") == 0.001
+        assert evalSpiceValue('"nmos"') == "nmos"
+        assert evalSpiceValue("'w*2'") == "w*2"
+        assert evalSpiceValue("nmos") == "nmos"
+        with pytest.raises(TypeError):
+            evalSpiceValue(1)
+
+    def test_scale(self):
+        assert evalSpiceValue("600n") == 600e-9
+        assert evalSpiceValue("1u") == 1e-6
+        assert evalSpiceValue("2.5meg") == 2.5e6
+        assert evalSpiceValue("2.5MEG") == 2.5e6
+        assert evalSpiceValue("1M") == 1e-3
+        assert evalSpiceValue("10pF") == 10e-12
+        assert evalSpiceValue("2mil") == 2 * 25.4e-6
+
+    def test_batch(self):
+        tokens = ["600n", "1u", "600n", "nmos"]
+        values = evalSpiceValues(tokens, cache=True)
+        assert values == [600e-9, 1e-6, 600e-9, "nmos"]
+        assert evalSpiceValues(tokens) == values
+
+    def test_batch_numpy(self):
+        np = pytest.importorskip("numpy")
+        array = evalSpiceValues(["600n", "1u", "3"], numpy=True)
+        assert array.dtype == np.float64
+        assert array.tolist() == [600e-9, 1e-6, 3.0]
+        with pytest.raises(ValueError):
+            evalSpiceValues(["600n", "nmos"], numpy=True)
@@ -0,0 +1,387 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from subprocess import TimeoutExpired
+from threading import Thread
+
+import pytest
+
+from icutk.string import LineIterator
+from icutk.subproc import (
+    AsyncPopen,
+    Disposable,
+    Popen,
+    PopenPool,
+    runDisposables,
+)
+
+
+class TestPopen:
+    def test_recv(self):
+        procs = [Popen(["bash"]) for _ in range(3)]
+        try:
+            for i, proc in enumerate(procs):
+                proc.send("echo hello", i)
+                proc.send("echo error >&2")
+                proc.send("echo done")
+            for i, proc in enumerate(procs):
+                assert proc.recv("done") == [f"hello {i}\n", "done\n"]
+                assert proc.stderr_queue.get(timeout=5) == "error\n"
+            # 所有进程共用一个读取线程
+            assert len({proc.stdout_thread for proc in procs}) == 1
+        finally:
+            for proc in procs:
+                proc.stop()
+
+    def test_idle(self):
+        proc = Popen(["bash"])
+        try:
+            start = time.process_time()
+            time.sleep(0.5)
+            assert time.process_time() - start < 0.1
+        finally:
+            proc.stop()
+
+    def test_exit(self):
+        proc = Popen("sleep 0.2; printf 'a\\nb'")
+        proc.wait(timeout=5)
+        for _ in range(50):
+            if proc.stdout_queue.qsize() == 2:
+                break
+            time.sleep(0.1)
+        assert list(proc.stdout_queue.queue) == ["a\n", "b"]
+
+    def test_heads(self):
+        proc = Popen(["bash"])
+        try:
+            for cmd in ("echo noise", "echo begin", "echo 1", "echo end"):
+                proc.send(cmd)
+            assert proc.recv("end", heads="begin") == ["begin\n", "1\n", "end\n"]
+        finally:
+            proc.stop()
+
+    def test_timeout(self):
+        proc = Popen(["bash"])
+        try:
+            proc.send("echo partial")
+            start = time.monotonic()
+            with pytest.raises(TimeoutExpired) as info:
+                proc.recv("never", timeout=0.3)
+            assert time.monotonic() - start < 2
+            assert info.value.output == "partial\n"
+        finally:
+            proc.stop()
+
+    def test_latency(self):
+        proc = Popen(["bash"])
+        try:
+            start = time.monotonic()
+            for i in range(20):
+                proc.send("echo", i)
+                assert proc.recv(str(i), timeout=5) == [f"{i}\n"]
+            # 不再每次等待 100ms
+            assert time.monotonic() - start < 1
+        finally:
+            proc.stop()
+
+    def test_batch(self):
+        proc = Popen(["bash"])
+        try:
+            commands = [f"seq {i}" for i in range(200)] + [("echo", "a", 1)]
+            results = proc.batch(commands, timeout=10)
+            assert len(results) == 201
+            assert results[0] == []
+            assert results[3] == ["1\n", "2\n", "3\n"]
+            assert results[-1] == ["a 1\n"]
+            # 之后仍可以正常交互
+            proc.send("echo done")
+            assert proc.recv("done", timeout=5) == ["done\n"]
+        finally:
+            proc.stop()
+
+    def test_batch_prompt(self):
+        proc = Popen(["bash"])
+        try:
+            # 模拟在输出前打印提示符的工具
+            commands = ["printf '%% 1\\n'", "printf '> '"]
+            results = proc.batch(
+                commands, sentinel="printf '> {}\\n'", timeout=5, prompt=r"[%>] "
+            )
+            assert results == [["1\n"], []]
+        finally:
+            proc.stop()
+
+    def test_batch_echo(self):
+        # 模拟回显命令的工具, 回显的哨兵命令不能当作标记
+        script = (
+            "import sys\n"
+            "for line in sys.stdin:\n"
+            "    cmd = line.rstrip()\n"
+            "    print('> ' + cmd, flush=True)\n"
+            "    if cmd.startswith('echo '):\n"
+            "        print(cmd[5:], flush=True)\n"
+        )
+        proc = Popen([sys.executable, "-c", script])
+        try:
+            results = proc.batch(["echo a", "echo b"], timeout=5, prompt="> ")
+            assert results == [["echo a\n", "a\n"], ["echo b\n", "b\n"]]
+        finally:
+            proc.stop()
+
+    def test_recv_eof(self):
+        proc = Popen("sleep 0.2; echo only")
+        with pytest.raises(ChildProcessError):
+            proc.recv("never", timeout=5)
+
+    def test_context_manager(self):
+        def session():
+            with Popen(["bash"]) as proc:
+                proc.send("exit")
+            # fd 被复用后仍能注册, 共享线程不会退出
+            for _ in range(3):
+                proc = Popen(["bash"])
+                try:
+                    proc.send("echo", "ok")
+                    results.append(proc.recv("ok", timeout=5))
+                finally:
+                    proc.stdout.close()
+                    proc.stop()
+
+        results = []
+        thread = Thread(target=session, daemon=True)
+        thread.start()
+        thread.join(10)
+        assert not thread.is_alive()
+        assert results == [["ok\n"]] * 3
+
+    def test_bad_output(self, monkeypatch):
+        # 无法解码的字节被替换, 不影响读取
+        with Popen(["bash"]) as proc:
+            proc.send(r"printf '\xff\xfe\nok\n'")
+            assert proc.recv("ok", timeout=3) == ["\ufffd\ufffd\n", "ok\n"]
+
+        # 回调出错只关闭该进程的队列, 共享线程继续服务其他进程
+        def fail(*args, **kwargs):
+            raise RuntimeError("broken output")
+
+        monkeypatch.setattr("icutk.subproc.print", fail, raising=False)
+        with Popen(["bash"], verbose=True) as broken, Popen(["bash"]) as proc:
+            broken.send("echo", "dead")
+            with pytest.raises(ChildProcessError):
+                broken.recv("dead", timeout=3)
+            proc.send("echo", "alive")
+            assert proc.recv("alive", timeout=3) == ["alive\n"]
+
+
+class TestAsyncPopen:
+    def test_recv(self):
+        async def session(i):
+            async with AsyncPopen(["bash"]) as proc:
+                await proc.send("echo noise")
+                await proc.send("echo begin", i)
+                await proc.send("echo error >&2")
+                await proc.send("echo end")
+                result = await proc.recv("end", heads="begin", timeout=5)
+                assert await proc.stderr_queue.get() == "error\n"
+                return result
+
+        async def main():
+            return await asyncio.gather(*(session(i) for i in range(5)))
+
+        for i, result in enumerate(asyncio.run(main())):
+            assert result == [f"begin {i}\n", "end\n"]
+
+    def test_timeout(self):
+        async def main():
+            async with AsyncPopen("cat") as proc:
+                await proc.send("partial")
+                with pytest.raises(TimeoutExpired) as info:
+                    await proc.recv("never", timeout=0.3)
+                assert info.value.output == "partial\n"
+
+        asyncio.run(main())
+
+    def test_recv_eof(self):
+        async def main():
+            async with AsyncPopen("echo only") as proc:
+                with pytest.raises(ChildProcessError):
+                    await proc.recv("never", timeout=5)
+
+        asyncio.run(main())
+
+    def test_long_line(self):
+        # 超过 StreamReader 默认 64 KiB 限制的行
+        async def main():
+            async with AsyncPopen(["bash"]) as proc:
+                await proc.send("printf 'x%.0s' {1..100000}; echo; echo end")
+                return await proc.recv("end", timeout=5)
+
+        assert asyncio.run(main()) == ["x" * 100000 + "\n", "end\n"]
+
+
+class Sleep(Disposable):
+    def __init__(self, seconds: float) -> None:
+        super().__init__()
+        self.seconds = seconds
+        self.calls = []
+
+    def start_init(self) -> None:
+        self.calls.append("start_init")
+
+    def process_args(self):
+        self.calls.append("process_args")
+        return f"sleep {self.seconds}; echo {self.seconds}"
+
+    def begin_before(self) -> None:
+        self.calls.append("begin_before")
+
+    def join_after(self) -> None:
+        self.calls.append("join_after")
+
+
+class TestRunDisposables:
+    def test_completion_order(self):
+        jobs = [Sleep(0.6), Sleep(0.1), Sleep(0.3)]
+        start = time.monotonic()
+        results = list(runDisposables(jobs, max_workers=3))
+        assert time.monotonic() - start < 1.2
+        assert [job.seconds for job, _ in results] == [0.1, 0.3, 0.6]
+        for job, result in results:
+            assert result.returncode == 0
+            assert result.stdout == f"{job.seconds}\n"
+            assert job.calls == [
+                "start_init",
+                "process_args",
+                "begin_before",
+                "join_after",
+            ]
+
+    def test_max_workers(self):
+        jobs = (Sleep(0.2) for _ in range(4))
+        start = time.monotonic()
+        assert len(list(runDisposables(jobs, max_workers=2))) == 4
+        assert time.monotonic() - start >= 0.4
+
+
+class Seq(Disposable):
+    def __init__(self, count: int, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.count = count
+
+    def process_args(self):
+        return f"seq {self.count}; echo error >&2"
+
+
+class TestDisposableSpool:
+    def test_memory(self):
+        result = Seq(3).run()
+        assert result.stdout == "1\n2\n3\n"
+        assert result.stderr == "error\n"
+
+    def test_spool(self):
+        job = Seq(100000, spool=True, tail=2)
+        try:
+            result = job.run()
+            assert result.returncode == 0
+            assert isinstance(job.stdout, Path)
+            assert job.stdout_tail == ["99999\n", "100000\n"]
+            assert job.stderr_tail == ["error\n"]
+            lines = LineIterator.from_file(job.stdout)
+            assert lines.total_lines == 100000
+            assert lines.next == "1\n"
+        finally:
+            job.cleanup()
+        assert not job.stdout.exists()
+
+    def test_spool_file(self, tmp_path):
+        job = Seq(3, stdout_file=tmp_path / "seq.log")
+        job.run()
+        assert job.stdout == tmp_path / "seq.log"
+        assert job.stdout.read_text() == "1\n2\n3\n"
+        assert job.stderr.read_text() == "error\n"
+        job.cleanup()
+        assert job.stdout.exists()
+
+
+class TestPopenPool:
+    def test_reuse(self):
+        with PopenPool(["bash"], max_size=2, probe=("echo ok", "ok")) as pool:
+            with pool.session() as proc:
+                proc.send("echo $$")
+                pid = proc.recv(r"\d+", targets_regex=True)
+                proc.send("echo leftover")
+                time.sleep(0.1)
+            assert pool.size == 1
+            assert pool.idle == 1
+            with pool.session() as proc:
+                proc.send("echo $$")
+                assert proc.recv(r"\d+", targets_regex=True) == pid
+
+    def test_max_size(self):
+        with PopenPool(["bash"], max_size=1) as pool:
+            proc = pool.checkout()
+            with pytest.raises(TimeoutError):
+                pool.checkout(timeout=0.2)
+            pool.checkin(proc)
+            assert pool.checkout(timeout=0.2) is proc
+            pool.checkin(proc)
+
+    def test_unhealthy(self):
+        with PopenPool(["bash"], max_size=1, probe=("echo ok", "ok")) as pool:
+            proc = pool.checkout()
+            pool.checkin(proc)
+            proc.send("exit")
+            proc.wait(timeout=5)
+            assert pool.checkout(timeout=5) is not proc
+
+    def test_max_idle(self):
+        with PopenPool(["bash"], max_size=2, min_size=1, max_idle=0.1) as pool:
+            first = pool.checkout()
+            second = pool.checkout()
+            pool.checkin(first)
+            pool.checkin(second)
+            time.sleep(0.3)
+            with pool.session():
+                # 保留 min_size 个进程
+                assert pool.size == 1
+
+
+class TestPopenBuffer:
+    def test_block(self):
+        proc = Popen(["bash"], buffer_size=100)
+        try:
+            proc.send("seq 100000; echo done")
+            time.sleep(0.5)
+            # 读取暂停，队列不会无限增长
+            assert proc.stdout_queue.qsize() < 100000
+            lines = proc.recv("done", timeout=30)
+            assert len(lines) == 100001
+            assert lines[-2] == "100000\n"
+        finally:
+            proc.stop()
+
+    def test_drop(self):
+        proc = Popen(["bash"], buffer_size=10, overflow="drop")
+        try:
+            proc.send("seq 1000; echo done")
+            for _ in range(50):
+                if proc.stdout_queue.dropped == 991:
+                    break
+                time.sleep(0.1)
+            assert proc.recv("done", timeout=5) == [
+                f"{i}\n" for i in range(992, 1001)
+            ] + ["done\n"]
+        finally:
+            proc.stop()
+
+    def test_spill(self):
+        proc = Popen(["bash"], buffer_size=10, overflow="spill")
+        try:
+            proc.send("seq 1000; printf done")
+            proc.stdin.close()
+            proc.wait(timeout=5)
+            lines = proc.recv("done", timeout=5)
+            assert lines == [f"{i}\n" for i in range(1, 1001)] + ["done"]
+        finally:
+            proc.stop()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from icutk.time import BenchmarkResult, MeasureTime, Profiler
+
+
+class TestProfiler:
+    def test_nested(self):
+        profiler = Profiler()
+
+        @profiler.span("lex")
+        def lex():
+            pass
+
+        with profiler.span("parse"):
+            for _ in range(3):
+                lex()
+        lex()
+
+        stats = profiler.stats()
+        assert set(stats) == {"parse", "parse/lex", "lex"}
+        assert stats["parse/lex"]["count"] == 3
+        assert stats["lex"]["count"] == 1
+        assert stats["parse"]["total"] >= stats["parse/lex"]["total"]
+        for stat in stats.values():
+            assert stat["min"] <= stat["p50"] <= stat["p99"] <= stat["max"]
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False)
+
+        @profiler.span()
+        def work():
+            return 1
+
+        with profiler.span("outer"):
+            assert work() == 1
+        assert profiler.stats() == {}
+
+        profiler.enabled = True
+        work()
+        assert list(profiler.stats()) == [work.__qualname__]
+
+    def test_threads_and_tasks(self):
+        profiler = Profiler()
+
+        def worker():
+            with profiler.span("thread"):
+                pass
+
+        @profiler.span("task")
+        async def task():
+            await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(task(), task())
+
+        with profiler.span("main"):
+            # 新线程不继承父 span
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+            asyncio.run(main())
+
+        stats = profiler.stats()
+        assert stats["thread"]["count"] == 1
+        assert stats["main/task"]["count"] == 2
+
+    def test_dump(self, tmp_path):
+        profiler = Profiler(trace=True)
+        with profiler.span("a"):
+            with profiler.span("b"):
+                pass
+        profiler.dump_json(tmp_path / "stats.json")
+        assert json.loads((tmp_path / "stats.json").read_text())["a/b"]["count"] == 1
+
+        profiler.dump_chrome_trace(tmp_path / "trace.json")
+        events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+        assert [e["name"] for e in events] == ["b", "a"]
+        assert all(e["ph"] == "X" for e in events)
+
+
+class TestBenchmark:
+    def test_benchmark(self, tmp_path):
+        result = MeasureTime(sorted, mute=True).benchmark(
+            (list(range(1000, 0, -1)),), warmup=1, repeat=7, name="sorted"
+        )
+        assert len(result.samples) == 7
+        assert result.number >= 1
+        assert result.samples[0] <= result.median <= result.p95 <= result.p99
+        assert result.stdev >= 0
+
+        baseline = tmp_path / "baseline.json"
+        result.save(baseline)
+        assert not result.compare(baseline)
+
+        slower = BenchmarkResult("sorted", [s * 2 for s in result.samples])
+        assert slower.compare(baseline, threshold=0.5)
+        assert not slower.compare(baseline, threshold=1.5)
+
+        with pytest.raises(KeyError):
+            BenchmarkResult("other", [1.0]).compare(baseline)
+
+    def test_auto_repeat(self):
+        result = MeasureTime(sum, mute=True).benchmark(([1, 2, 3],), duration=0.05)
+        assert len(result.samples) >= 5
+        assert result.samples[-1] * result.number < 0.1